@@ -0,0 +1,138 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+
+"""Vectorized assembly of the global stiffness matrix for meshes of linear triangles (solidspy
+element type 3), in plane stress with unit thickness. The arrays follow the solidspy layout:
+  nodes    [index, x, y, x-constraint, y-constraint]
+  elements [index, type, material, n1, n2, n3]
+  mats     [Young's modulus, Poisson's ratio]
+"""
+
+"""Equation number of every degree of freedom (nnodes, 2), -1 where it is constrained, and the
+number of equations. Same numbering as solidspy.assemutil.eqcounter.
+"""
+def equationNumbers(cons):
+  bc_array = np.where(np.asarray(cons) == 0, 0, -1)
+  free = bc_array == 0
+  bc_array[free] = np.arange(np.count_nonzero(free))
+  return bc_array, int(np.count_nonzero(free))
+
+"""Plane stress constitutive matrices (k, 3, 3), one per material row"""
+def elasticityMatrices(mats):
+  mats = np.reshape(np.asarray(mats, dtype=float), (len(mats), -1))
+  E, nu = mats[:, 0], mats[:, 1]
+  C = np.zeros((len(mats), 3, 3))
+  C[:, 0, 0] = C[:, 1, 1] = 1
+  C[:, 0, 1] = C[:, 1, 0] = nu
+  C[:, 2, 2] = (1 - nu) / 2
+  return C * (E / (1 - nu ** 2))[:, None, None]
+
+"""Strain-displacement matrices B (m, 3, 6) and areas (m,) of the triangles (m, 3) over the
+node coordinates (n, 2). The dofs of an element are ordered [u1, v1, u2, v2, u3, v3].
+"""
+def strainDisplacement(coords, triangles):
+  xy = np.asarray(coords, dtype=float)[triangles]
+  x, y = xy[:, :, 0], xy[:, :, 1]
+  # b_i = y_j - y_k, c_i = x_k - x_j over the cyclic permutations (i, j, k)
+  b = np.roll(y, -1, axis=1) - np.roll(y, -2, axis=1)
+  c = np.roll(x, -2, axis=1) - np.roll(x, -1, axis=1)
+  det = (x[:, 1] - x[:, 0]) * (y[:, 2] - y[:, 0]) - (x[:, 2] - x[:, 0]) * (y[:, 1] - y[:, 0])
+
+  B = np.zeros((len(xy), 3, 6))
+  B[:, 0, 0::2] = b
+  B[:, 1, 1::2] = c
+  B[:, 2, 0::2] = c
+  B[:, 2, 1::2] = b
+  B /= det[:, None, None]
+  return B, np.abs(det) / 2
+
+"""Element stiffness matrices area * B^T C B (m, 6, 6) from the B matrices (m, 3, 6), the
+areas (m,) and the material id of every element, one batched product per material group
+"""
+def elementMatrices(B, area, C, materials):
+  stiffness = np.empty((len(B), 6, 6))
+  for material in np.unique(materials):
+    group = materials == material
+    Bg = B[group]
+    stiffness[group] = np.matmul(Bg.transpose(0, 2, 1), np.matmul(C[material], Bg)) * area[group][:, None, None]
+  return stiffness
+
+"""Assembly of the stiffness matrix of one mesh and constraint pattern. The element dof map
+and the sparsity pattern are computed once: every element matrix entry is mapped to its slot
+in the CSR data, so (re)assembling for new coordinates or materials is a batched element pass
+and one bincount.
+"""
+class Assembly:
+  def __init__(self, nodes, elements):
+    nodes = np.asarray(nodes, dtype=float)
+    elements = np.asarray(elements, dtype=int)
+    self.triangles = elements[:, 3:6]
+    self.materials = elements[:, 2]
+    self.bc_array, self.neq = equationNumbers(nodes[:, -2:])
+    # equation numbers of the 6 dofs of every element, -1 where constrained
+    self.dofs = self.bc_array[self.triangles].reshape(-1, 6)
+
+    rows = np.broadcast_to(self.dofs[:, :, None], (len(self.dofs), 6, 6)).ravel()
+    cols = np.broadcast_to(self.dofs[:, None, :], (len(self.dofs), 6, 6)).ravel()
+    self.active = np.flatnonzero((rows >= 0) & (cols >= 0))
+    keys = rows[self.active].astype(np.int64) * max(self.neq, 1) + cols[self.active]
+    keys, self.slots = np.unique(keys, return_inverse=True)
+    self.slots = self.slots.ravel()
+    self.indices = (keys % max(self.neq, 1)).astype(np.int32)
+    self.indptr = np.zeros(self.neq + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys // max(self.neq, 1), minlength=self.neq), out=self.indptr[1:])
+
+  """Element stiffness matrices (m, 6, 6) for the node coordinates (n, 2), of every element
+  or of the given element ids only
+  """
+  def elementStiffness(self, coords, mats, elements = None):
+    elements = slice(None) if elements is None else elements
+    B, area = strainDisplacement(coords, self.triangles[elements])
+    return elementMatrices(B, area, elasticityMatrices(mats), self.materials[elements])
+
+  """Global stiffness matrix (CSR) from the element matrices (m, 6, 6)"""
+  def matrix(self, element_stiffness):
+    data = np.bincount(self.slots, weights=element_stiffness.reshape(-1)[self.active], minlength=len(self.indices))
+    return csr_matrix((data, self.indices, self.indptr), shape=(self.neq, self.neq))
+
+  """Update a matrix built by matrix in place, for new (k, 6, 6) matrices of k elements
+  replacing the old ones. Only the entries of those elements are touched.
+  """
+  def update(self, matrix, elements, old, new):
+    elements = np.asarray(elements, dtype=int)
+    begin = np.searchsorted(self.active, elements * 36)
+    end = np.searchsorted(self.active, elements * 36 + 36)
+    lengths = end - begin
+    positions = np.repeat(begin - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+    owner = np.repeat(np.arange(len(elements)), lengths)
+    delta = (new - old).reshape(len(elements), 36)[owner, self.active[positions] - elements[owner] * 36]
+    matrix.data += np.bincount(self.slots[positions], weights=delta, minlength=len(self.indices))
+    return matrix
+
+  """Right-hand side (neq,) of loads in the solidspy layout [node, x-force, y-force]; the
+  forces on constrained dofs are dropped"""
+  def loadVector(self, loads):
+    rhs = np.zeros(self.neq)
+    loads = np.reshape(np.asarray(loads, dtype=float), (-1, 3))
+    dof_ids = self.bc_array[loads[:, 0].astype(int)]
+    free = dof_ids != -1
+    rhs[dof_ids[free]] = loads[:, 1:3][free]
+    return rhs
+
+  """Nodal displacements (nnodes, 2) from the solution vector (neq,), zero where constrained"""
+  def nodalDisplacements(self, solution):
+    disp = np.zeros(self.bc_array.shape)
+    free = self.bc_array != -1
+    disp[free] = np.asarray(solution)[self.bc_array[free]]
+    return disp
+
+  def stiffness(self, coords, mats):
+    return self.matrix(self.elementStiffness(coords, mats))
+
+"""Global stiffness matrix (CSR), equation numbers (nnodes, 2) and number of equations of a
+model, the vectorized counterpart of solidspy's DME + assembler
+"""
+def assemble(nodes, elements, mats):
+  nodes = np.asarray(nodes, dtype=float)
+  assembly = Assembly(nodes, elements)
+  return assembly.stiffness(nodes[:, 1:3], mats), assembly.bc_array, assembly.neq
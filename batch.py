@@ -0,0 +1,186 @@
+import os
+import sys
+import json
+import time
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+"""Headless batch mode: runs image -> mesh -> boundary conditions -> solve for many jobs
+on a pool of processes, without any window.
+
+  python boxingfem.py batch specs/*.json -o results -j 4 [--profile trace.json]
+
+Each job is described by a JSON (or YAML) spec:
+
+  {
+    "image": "inputs/skull.png",          # relative to the spec file
+    "threshold": 150,                     # optional, gray level separating the materials
+    "scale": 50,                          # optional, mesh size is min(width, height) / scale
+    "simplify": 0.25,                     # optional, contour simplification tolerance (mesh sizes)
+    "min_area": 1.0,                      # optional, smallest hole/island kept (squared mesh sizes)
+    "spline": false,                      # optional, contours as splines instead of polylines
+    "min_size": 0.5, "max_size": 3,       # optional, graded mesh (multiples of the uniform size),
+    "growth": 1.3,                        #   refined near boundaries, constraints and forces
+    "renumber": true,                     # optional, bandwidth reducing node renumbering
+    "downsample": 4,                      # optional, contours traced on a reduced image ("auto")
+    "materials": [[100, 0.1], [10, 0.4]], # [Young's modulus, Poisson's ratio], one per material
+    "constraints": [{"bbox": [x1, y1, x2, y2], "x": true, "y": true}],
+    "forces": [{"bbox": [x1, y1, x2, y2], "fx": -4, "fy": -4}]
+  }
+
+Bounding boxes are in image pixels with y going up from the bottom of the image, the same
+space used by the selection in the GUI. Each job gets its own output directory holding
+model.bfem, the model with its results (the arrays of postprocess.Fields, and the gmsh order
+index of every node as permutation) in the binary layout of modelio; summary.json lists every
+job. `python modelio.py <job>/model.bfem <folder>` writes a model as solidspy text files.
+With --profile, the stages of every job are written as one trace (see instrument.py).
+"""
+
+# Spec entries handed over to MeshGenerator
+MESH_SETTINGS = ["threshold", "scale", "simplify", "min_area", "spline", "min_size", "max_size", "growth", "renumber", "downsample"]
+
+"""MeshGenerator keyword arguments of a spec: its mesh settings and, with refine, the boxes of
+its constraints and forces, where a graded mesh is refined"""
+def meshSettings(spec, refine = True):
+  settings = {k: spec[k] for k in MESH_SETTINGS if k in spec}
+  if refine:
+    settings["refine"] = [c["bbox"] for c in spec.get("constraints", []) + spec.get("forces", [])]
+  return settings
+
+def loadSpec(path):
+  with open(path) as f:
+    if path.endswith((".yml", ".yaml")):
+      import yaml
+      spec = yaml.safe_load(f)
+    else:
+      spec = json.load(f)
+  image = spec["image"]
+  if not os.path.isabs(image):
+    spec["image"] = os.path.join(os.path.dirname(os.path.abspath(path)), image)
+  return spec
+
+"""Set the constraints and forces of a spec on the boundary points of the generator"""
+def applyBoundaryConditions(generator, spec):
+  for c in spec.get("constraints", []):
+    generator.boundary.applyConstraints(generator.getSelection(tuple(c["bbox"])), x=c.get("x", False), y=c.get("y", False))
+  for f in spec.get("forces", []):
+    generator.boundary.setForces(generator.getSelection(tuple(f["bbox"])), f.get("fx", 0.0), f.get("fy", 0.0))
+
+"""Check the [Young's modulus, Poisson's ratio] pairs of a spec before anything is meshed.
+Raises ValueError, naming the spec, when there are none or a material cannot be solved
+(E > 0 and -1 < nu < 0.5)."""
+def checkMaterials(spec, name = "spec"):
+  materials = spec.get("materials") or []
+  if not isinstance(materials, list) or not materials:
+    raise ValueError(f"{name}: materials must list one [E, nu] pair per material")
+  for i, m in enumerate(materials, 1):
+    if not isinstance(m, (list, tuple)) or len(m) != 2:
+      raise ValueError(f"{name}: material {i} is {m}, expected [E, nu]")
+    try:
+      E, nu = map(float, m)
+    except (TypeError, ValueError):
+      raise ValueError(f"{name}: material {i} is {m}, expected numbers [E, nu]") from None
+    if not E > 0:
+      raise ValueError(f"{name}: material {i} has Young's modulus {E}, expected E > 0")
+    if not -1 < nu < 0.5:
+      raise ValueError(f"{name}: material {i} has Poisson's ratio {nu}, expected -1 < nu < 0.5")
+
+"""Material list of a spec, one [Young's modulus, Poisson's ratio] per material patch. Raises
+ValueError, naming the spec, when the count does not match the mesh or a material cannot be
+solved (see checkMaterials)."""
+def specMaterials(spec, count, name = "spec"):
+  checkMaterials(spec, name)
+  materials = spec["materials"]
+  if len(materials) != count:
+    raise ValueError(f"{name}: the mesh has {count} materials, the spec gives {len(materials)} [E, nu] pairs")
+  return [list(map(float, m)) for m in materials]
+
+"""Run one job in the current process. Returns its summary entry."""
+def runJob(spec_path, out_dir):
+  import instrument
+  import modelio
+  import solver
+  from mesh import MeshGenerator
+
+  name = os.path.splitext(os.path.basename(spec_path))[0]
+  job_dir = os.path.join(out_dir, name)
+  os.makedirs(job_dir, exist_ok=True)
+  entry = {"job": name, "spec": spec_path, "output": job_dir}
+  start = time.perf_counter()
+  try:
+    spec = loadSpec(spec_path)
+    # a bad spec fails before its mesh is built
+    checkMaterials(spec, name)
+    generator = MeshGenerator(spec["image"], **meshSettings(spec))
+    mesh_time = time.perf_counter() - start
+
+    applyBoundaryConditions(generator, spec)
+    nodes, elements, loads, mats = generator.getModel(specMaterials(spec, len(generator.patches_plot_legend), name))
+
+    solve_start = time.perf_counter()
+    fields = solver.solve(nodes, elements, loads, mats)
+    solve_time = time.perf_counter() - solve_start
+
+    modelio.writeModel(os.path.join(job_dir, modelio.MODEL_FILE), nodes, elements, loads, mats, fields, permutation=generator.permutation)
+    entry.update(status="ok", nodes=len(nodes), elements=len(elements), loads=len(loads), mesh_time=mesh_time, solve_time=solve_time,
+                 **generator.bandwidth_report)
+  except Exception as e:
+    entry.update(status="failed", error=f"{type(e).__name__}: {e}", traceback=traceback.format_exc())
+  entry["time"] = time.perf_counter() - start
+  # the stages measured in this worker process go back to the main process with the entry
+  entry["stages"] = instrument.drain()
+  return entry
+
+def main(argv = None):
+  parser = argparse.ArgumentParser(prog="boxingfem batch", description="Run image -> mesh -> solve jobs without the GUI")
+  parser.add_argument("specs", nargs="+", help="JSON/YAML job specs")
+  parser.add_argument("-o", "--output", default="results", help="output directory, one sub directory per job")
+  parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="number of worker processes")
+  parser.add_argument("--profile", help="write the stage timings and memory of every job to this trace file")
+  args = parser.parse_args(argv)
+
+  if args.profile:
+    import instrument
+    instrument.enable(args.profile)
+    # worker processes started afresh pick it up from the environment
+    os.environ[instrument.ENVIRONMENT] = args.profile
+
+  names = [os.path.splitext(os.path.basename(s))[0] for s in args.specs]
+  if len(set(names)) != len(names):
+    parser.error("job specs need distinct file names, they name the output directories")
+
+  os.makedirs(args.output, exist_ok=True)
+  start = time.perf_counter()
+  entries = []
+  # one job per worker at a time, every job runs its own gmsh session
+  with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+    futures = [pool.submit(runJob, os.path.abspath(s), os.path.abspath(args.output)) for s in args.specs]
+    for future in as_completed(futures):
+      entry = future.result()
+      stages = entry.pop("stages")
+      if args.profile:
+        instrument.extend(stages)
+      entries.append(entry)
+      print(f"[Batch] {entry['job']}: {entry['status']} ({entry['time']:.2f}s)")
+  elapsed = time.perf_counter() - start
+
+  done = [e for e in entries if e["status"] == "ok"]
+  summary = {
+    "jobs": len(entries),
+    "succeeded": len(done),
+    "failed": len(entries) - len(done),
+    "workers": args.jobs,
+    "wall_time": elapsed,
+    "jobs_per_second": len(entries) / elapsed if elapsed > 0 else 0.0,
+    "elements_per_second": sum(e["elements"] for e in done) / elapsed if elapsed > 0 else 0.0,
+    "results": sorted(entries, key=lambda e: e["job"]),
+  }
+  with open(os.path.join(args.output, "summary.json"), "w") as f:
+    json.dump(summary, f, indent=2)
+
+  print(f"[Batch] {summary['succeeded']}/{summary['jobs']} jobs in {elapsed:.2f}s ({summary['jobs_per_second']:.2f} jobs/s)")
+  return 0 if summary["failed"] == 0 else 1
+
+if __name__ == '__main__':
+  sys.exit(main())
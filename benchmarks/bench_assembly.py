@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import solidspy.assemutil as ass
+import solidspy.postprocesor as pos
+import solidspy.solutil as sol
+import assembly
+import modelio
+import solver
+
+"""Benchmark of the stiffness matrix assembly: solidspy's per element loop (DME + assembler)
+against the vectorized assembly.Assembly, on the model saved in a solidspy text folder. Also
+reports the time to reassemble with a precomputed Assembly and the largest difference between
+the two matrices, relative to their largest entry. Both matrices, and the displacements solved
+by solver.solve and by solidspy, must agree within TOLERANCE: the script exits with status 1
+otherwise.
+
+  python benchmarks/bench_assembly.py [folder]
+"""
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Largest difference allowed with solidspy, relative to the largest entry
+TOLERANCE = 1e-8
+
+def timed(function, *args):
+  start = time.perf_counter()
+  result = function(*args)
+  return time.perf_counter() - start, result
+
+def solidspyAssemble(nodes, elements, mats):
+  assem_op, bc_array, neq = ass.DME(nodes[:, -2:], elements)
+  stiffness, _ = ass.assembler(elements, mats, nodes[:, :3], neq, assem_op)
+  return stiffness, bc_array, neq
+
+"""Nodal displacements (n, 2) solved by solidspy from its own matrix"""
+def solidspyDisplacements(nodes, loads, stiffness, bc_array, neq):
+  rhs = ass.loadasem(loads, bc_array, neq)
+  return pos.complete_disp(bc_array, nodes, sol.static_sol(stiffness, rhs))
+
+"""Whether new agrees with the solidspy reference within TOLERANCE of its largest entry"""
+def agrees(new, reference):
+  return np.allclose(new, reference, rtol=0, atol=TOLERANCE * abs(reference).max())
+
+if __name__ == '__main__':
+  folder = sys.argv[1] if len(sys.argv) > 1 else os.path.join(ROOT, "data")
+  nodes, elements, loads, mats = modelio.readText(folder)
+
+  reference_time, (reference, bc_array, neq) = timed(solidspyAssemble, nodes, elements, mats)
+  vectorized_time, (stiffness, _, _) = timed(assembly.assemble, nodes, elements, mats)
+  pattern = assembly.Assembly(nodes, elements)
+  reassembly_time, _ = timed(pattern.stiffness, nodes[:, 1:3], mats)
+
+  error = abs(stiffness - reference).max() / abs(reference).max()
+  print(f"{len(elements)} elements, {stiffness.shape[0]} equations, {stiffness.nnz} non zeros")
+  print(f"{'solidspy':>12} {reference_time:>8.3f} s")
+  print(f"{'vectorized':>12} {vectorized_time:>8.3f} s  ({reference_time / vectorized_time:.0f}x)")
+  print(f"{'reassembly':>12} {reassembly_time:>8.3f} s  ({reference_time / reassembly_time:.0f}x)")
+  print(f"relative difference {error:.1e}")
+
+  displacements = solver.solve(nodes, elements, loads, mats).displacements
+  expected = solidspyDisplacements(nodes, loads, reference, bc_array, neq)
+  displacement_error = abs(displacements - expected).max() / abs(expected).max()
+  print(f"displacements: relative difference {displacement_error:.1e}")
+
+  failures = []
+  # compared as sparse matrices, a dense copy of the stiffness would not fit in memory
+  if not error <= TOLERANCE:
+    failures.append(f"stiffness matrices differ by {error:.1e}")
+  if not agrees(displacements, expected):
+    failures.append(f"displacements differ by {displacement_error:.1e}")
+  for failure in failures:
+    print("FAIL " + failure + f", tolerance {TOLERANCE:.0e}")
+  print("OK" if not failures else f"{len(failures)} failures")
+  sys.exit(1 if failures else 0)
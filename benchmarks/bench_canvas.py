@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import pygame
+import raster
+from canvas import Canvas
+
+"""Benchmark of the canvas on large layers: three size x size layers (the image, the patches
+and the boundary points) drawn on a 1280 x 800 screen at growing zooms. For every zoom, the
+first frame (composing the view from the layer pyramids) and a panned frame are timed, against
+scaling the full resolution composite to the zoom, which is what drawing without the pyramids
+costs on every zoom change.
+
+  python benchmarks/bench_canvas.py [size]
+"""
+
+SCREEN = (1280, 800)
+ZOOMS = [0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0]
+
+def timed(function, *args):
+  start = time.perf_counter()
+  result = function(*args)
+  return time.perf_counter() - start, result
+
+def layer(size, seed):
+  rng = np.random.default_rng(seed)
+  buffer = raster.newBuffer(size, size)
+  buffer[rng.integers(0, size, 4096), rng.integers(0, size, 4096)] = rng.integers(0, 255, (4096, 3))
+  return buffer, raster.toSurface(buffer)
+
+"""Full resolution composite of the layers scaled to the zoom, as one smoothscale"""
+def scaledComposite(layers, size, zoom):
+  surface = pygame.Surface((size, size))
+  for l in layers:
+    surface.blit(l, (0, 0))
+  return pygame.transform.smoothscale(pygame.transform.flip(surface, False, True), (int(size * zoom), int(size * zoom)))
+
+if __name__ == '__main__':
+  size = int(sys.argv[1]) if len(sys.argv) > 1 else 4096
+  buffers, layers = zip(*(layer(size, seed) for seed in range(3)))
+  screen = pygame.Surface(SCREEN)
+  canvas = Canvas((size, size))
+  canvas.setLayers(layers)
+  pyramids, _ = timed(lambda: [canvas.pyramid(l) for l in layers])
+  print(f"{size} x {size} layers, pyramids of {len(canvas.pyramid(layers[0]))} levels built in {pyramids:.3f} s")
+  print(f"{'zoom':>6} {'first (ms)':>11} {'panned (ms)':>12} {'full scale (ms)':>16}")
+  for zoom in ZOOMS:
+    canvas.zoom = zoom
+    canvas.origin = (0, 0)
+    first, _ = timed(canvas.end, screen)
+    canvas.origin = (-37, -21)
+    panned, _ = timed(canvas.end, screen)
+    # the full resolution composite gets too large to scale past a few times the image
+    full = timed(scaledComposite, layers, size, zoom)[0] if size * zoom <= 2 * size else float("nan")
+    print(f"{zoom:>6} {first * 1e3:>11.1f} {panned * 1e3:>12.1f} {full * 1e3:>16.1f}")
@@ -0,0 +1,43 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import solver
+from batch import applyBoundaryConditions
+from mesh import MeshGenerator, SCALE
+from resultlayers import ResultLayers, FIELDS
+
+"""Benchmark of the result field layers. The skull example is solved at growing mesh
+resolutions, then the time to rasterize the (deformed) triangles, to render every field
+layer once and to switch back to an already rendered field is reported.
+
+  python benchmarks/bench_fields.py
+"""
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+SPEC = {
+  "image": os.path.join(ROOT, "inputs", "skull.png"),
+  "materials": [[100, 0.1], [10, 0.4]],
+  "constraints": [{"bbox": [0, 0, 200, 5], "x": True, "y": True}],
+  "forces": [{"bbox": [80, 150, 110, 170], "fx": 0, "fy": -4}],
+}
+
+def timed(function, *args):
+  start = time.perf_counter()
+  function(*args)
+  return time.perf_counter() - start
+
+if __name__ == '__main__':
+  print(f"{'elements':>9} {'rasterize (ms)':>15} {'field (ms)':>11} {'switch (ms)':>12}")
+  for scale in (SCALE, 2 * SCALE, 4 * SCALE):
+    generator = MeshGenerator(SPEC["image"], scale=scale)
+    applyBoundaryConditions(generator, SPEC)
+    fields = solver.solve(*generator.getModel(SPEC["materials"]))
+    layers = ResultLayers(generator.width, generator.height, generator.coords, generator.elements, fields)
+
+    rasterize = min(timed(layers.setScale, s) for s in (0.25, 0.5, 0.75))
+    field = sum(timed(layers.layer, name) for name in FIELDS) / len(FIELDS)
+    switch = sum(timed(layers.layer, name) for name in FIELDS) / len(FIELDS)
+    print(f"{len(generator.elements):>9} {rasterize * 1e3:>15.2f} {field * 1e3:>11.2f} {switch * 1e3:>12.4f}")
@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import modelio
+import solver
+
+"""Benchmark of the model files: write and read times of the solidspy text layout against the
+binary layout (model.bfem), for the model of a solidspy text folder refined by splitting every
+triangle into four, a few times over. The binary read is timed twice, mapping the file only and
+touching every array. The text layout rounds the node coordinates, the largest rounding error
+is printed.
+
+  python benchmarks/bench_modelio.py [folder] [refinements]
+"""
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+"""Split every triangle into four at its edge midpoints; constraints of the new nodes are
+dropped, which is enough to time the files"""
+def refine(nodes, elements):
+  triangles = elements[:, 3:6]
+  edges = np.sort(np.concatenate([triangles[:, [0, 1]], triangles[:, [1, 2]], triangles[:, [2, 0]]]), axis=1)
+  unique, inverse = np.unique(edges, axis=0, return_inverse=True)
+  middle = len(nodes) + inverse.ravel().reshape(3, -1).T
+  new_nodes = np.zeros((len(unique), 5))
+  new_nodes[:, 1:3] = nodes[unique][:, :, 1:3].mean(axis=1)
+  nodes = np.concatenate([nodes, new_nodes])
+  nodes[:, 0] = np.arange(len(nodes))
+  a, b, c = triangles.T
+  ab, bc, ca = middle.T
+  triangles = np.concatenate([np.stack(t, axis=1) for t in ((a, ab, ca), (ab, b, bc), (ca, bc, c), (ab, bc, ca))])
+  materials = np.tile(elements[:, 2], 4)
+  elements = np.column_stack([np.arange(len(triangles)), np.full(len(triangles), 3), materials, triangles])
+  return nodes, elements
+
+def timed(function, *args):
+  start = time.perf_counter()
+  result = function(*args)
+  return time.perf_counter() - start, result
+
+def touch(arrays):
+  return sum(float(np.asarray(a).sum()) for a in arrays)
+
+if __name__ == '__main__':
+  folder = sys.argv[1] if len(sys.argv) > 1 else os.path.join(ROOT, "data")
+  refinements = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+  nodes, elements, loads, mats = modelio.readText(folder)
+  fields = solver.solve(nodes, elements, loads, mats)
+  print(f"{'elements':>9} {'layout':>7} {'write (s)':>10} {'read (s)':>9} {'touch (s)':>10} {'size (MB)':>10}")
+  with tempfile.TemporaryDirectory() as tmp:
+    for level in range(refinements + 1):
+      if level:
+        nodes, elements = refine(nodes, elements)
+        fields = None
+      text = os.path.join(tmp, f"text{level}")
+      binary = os.path.join(tmp, f"model{level}.bfem")
+
+      write, _ = timed(modelio.writeText, text, nodes, elements, loads, mats)
+      read, model = timed(modelio.readText, text)
+      size = sum(os.path.getsize(os.path.join(text, f)) for f in os.listdir(text))
+      print(f"{len(elements):>9} {'text':>7} {write:>10.4f} {read:>9.4f} {'':>10} {size / 1e6:>10.2f}")
+      error = np.abs(model[0][:, 1:3] - nodes[:, 1:3]).max()
+
+      write, _ = timed(modelio.writeModel, binary, nodes, elements, loads, mats)
+      read, model = timed(modelio.readModel, binary)
+      used, _ = timed(touch, model)
+      print(f"{len(elements):>9} {'binary':>7} {write:>10.4f} {read:>9.4f} {used:>10.4f} {os.path.getsize(binary) / 1e6:>10.2f}")
+      assert all(np.array_equal(a, b) for a, b in zip(model, (nodes, elements, loads, mats)))
+      print(f"{'':>9} largest text rounding of the node coordinates {error:.1e}, binary exact")
+
+    if fields is None:
+      fields = solver.solve(nodes, elements, loads, mats)
+    binary = os.path.join(tmp, "results.bfem")
+    write, _ = timed(modelio.writeModel, binary, nodes, elements, loads, mats, fields)
+    npz = os.path.join(tmp, "results.npz")
+    npz_write, _ = timed(lambda: np.savez_compressed(npz, **fields._asdict()))
+    read, results = timed(modelio.readResults, binary)
+    npz_read, _ = timed(lambda: dict(np.load(npz)))
+    print(f"results of {len(elements)} elements: binary write {write:.4f} s read {read:.4f} s, "
+          f"compressed npz write {npz_write:.4f} s read {npz_read:.4f} s")
@@ -0,0 +1,47 @@
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import raster
+
+"""Benchmark of the layer rasterizer. A structured triangulation of a square image is
+refined step by step and the time to fill the patches layer is reported per element, which
+should stay roughly flat as the element count grows.
+
+  python benchmarks/bench_raster.py
+"""
+
+"""Structured mesh of n x n cells (2 triangles each) over a size x size image"""
+def gridMesh(n, size):
+  xs = np.linspace(0, size - 1, n + 1)
+  X, Y = np.meshgrid(xs, xs)
+  coords = np.column_stack((X.ravel(), Y.ravel()))
+  ids = np.arange((n + 1) * (n + 1)).reshape(n + 1, n + 1)
+  a = ids[:-1, :-1].ravel()
+  b = ids[:-1, 1:].ravel()
+  c = ids[1:, 1:].ravel()
+  d = ids[1:, :-1].ravel()
+  triangles = np.concatenate((np.column_stack((a, b, c)), np.column_stack((a, c, d))))
+  materials = np.arange(len(triangles)) % 2
+  return coords, triangles, materials
+
+def timeLayer(coords, triangles, materials, size, repeat = 5):
+  best = float("inf")
+  for _ in range(repeat):
+    start = time.perf_counter()
+    buffer = raster.newBuffer(size, size)
+    for m in range(2):
+      raster.fillTriangles(buffer, coords, triangles[materials == m], (0.1, 0.5, 0.7))
+    raster.stampPoints(buffer, coords[0:len(coords):7], (0, 0.9, 0.1), 2)
+    best = min(best, time.perf_counter() - start)
+  return best
+
+if __name__ == '__main__':
+  size = 2048
+  print(f"{'elements':>10} {'time (ms)':>10} {'us/element':>11}")
+  for n in (16, 32, 64, 128, 256, 512):
+    coords, triangles, materials = gridMesh(n, size)
+    t = timeLayer(coords, triangles, materials, size)
+    print(f"{len(triangles):>10} {t * 1e3:>10.2f} {t * 1e6 / len(triangles):>11.3f}")
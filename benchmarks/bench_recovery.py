@@ -0,0 +1,47 @@
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import solidspy.postprocesor as pos
+import modelio
+import postprocess
+import solver
+
+"""Benchmark of the strain/stress recovery: solidspy's per element strain_nodes loop against
+postprocess.Recovery, on the model saved in a solidspy text folder. The element stresses are
+checked against solidspy's, which only adds the strains of an element to its first node (the
+other two get zeros while still being counted), so the comparison rebuilds that average from
+the vectorized element stresses.
+
+  python benchmarks/bench_recovery.py [folder]
+"""
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+def timed(function, *args):
+  start = time.perf_counter()
+  result = function(*args)
+  return time.perf_counter() - start, result
+
+if __name__ == '__main__':
+  folder = sys.argv[1] if len(sys.argv) > 1 else os.path.join(ROOT, "data")
+  nodes, elements, loads, mats = modelio.readText(folder)
+  displacements = solver.solve(nodes, elements, loads, mats).displacements
+
+  reference_time, (_, reference) = timed(pos.strain_nodes, nodes, elements, mats, displacements)
+  setup_time, recovery = timed(postprocess.Recovery, nodes[:, 1:3], elements[:, 3:6], elements[:, 2], mats)
+  fields_time, fields = timed(recovery.fields, displacements)
+
+  triangles = elements[:, 3:6]
+  first_node = np.zeros((len(nodes), 3))
+  np.add.at(first_node, triangles[:, 0], fields.element_stresses)
+  first_node /= np.bincount(triangles.ravel(), minlength=len(nodes))[:, None]
+  error = np.abs(first_node - reference).max() / np.abs(reference).max()
+
+  print(f"{len(elements)} elements, {len(nodes)} nodes")
+  print(f"{'solidspy':>12} {reference_time:>8.3f} s")
+  print(f"{'setup':>12} {setup_time:>8.3f} s")
+  print(f"{'fields':>12} {fields_time:>8.3f} s  ({reference_time / fields_time:.0f}x, with von Mises and principal stresses)")
+  print(f"relative difference of the element stresses {error:.1e}")
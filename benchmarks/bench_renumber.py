@@ -0,0 +1,74 @@
+import os
+import sys
+import time
+import numpy as np
+from scipy.sparse.linalg import splu
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import assembly
+from batch import applyBoundaryConditions
+from mesh import MeshGenerator, SCALE
+
+"""Benchmark of the node renumbering. The skull example is meshed with the gmsh node order and
+with the reverse Cuthill-McKee order, at the default and a twice finer resolution. For each mesh
+the bandwidth and profile of the node graph are reported, together with the time and the
+fill-in (non zeros of L + U) of the stiffness factorization, with the natural equation order and
+with the column ordering splu picks by default. The displacements of both orders are compared
+in the gmsh order, which also checks that the loads and constraints follow the permutation.
+The natural order factorization is skipped (-) for profiles above NATURAL_PROFILE, where it
+takes minutes.
+
+  python benchmarks/bench_renumber.py
+"""
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+SPEC = {
+  "image": os.path.join(ROOT, "inputs", "skull.png"),
+  "materials": [[100, 0.1], [10, 0.4]],
+  "constraints": [{"bbox": [0, 0, 200, 5], "x": True, "y": True}],
+  "forces": [{"bbox": [80, 150, 110, 170], "fx": 0, "fy": -4}],
+}
+
+NATURAL_PROFILE = 5000000
+
+def factorize(matrix, permc_spec):
+  start = time.perf_counter()
+  lu = splu(matrix, permc_spec=permc_spec)
+  return time.perf_counter() - start, lu.L.nnz + lu.U.nnz, lu
+
+def run(scale, renumber):
+  generator = MeshGenerator(SPEC["image"], scale=scale, cache=None, renumber=renumber)
+  applyBoundaryConditions(generator, SPEC)
+  nodes, elements, loads, mats = generator.getModel(SPEC["materials"])
+  stiffness, bc_array, neq = assembly.assemble(nodes, elements, mats)
+  stiffness = stiffness.tocsc()
+
+  report = generator.bandwidth_report
+  band, profile = (report["bandwidth_renumbered"], report["profile_renumbered"]) if renumber else (report["bandwidth"], report["profile"])
+  natural = factorize(stiffness, "NATURAL")[:2] if profile <= NATURAL_PROFILE else None
+  colamd_time, colamd_fill, lu = factorize(stiffness, "COLAMD")
+
+  rhs = np.zeros(neq)
+  dof_ids = bc_array[loads[:, 0].astype(int)]
+  free = dof_ids != -1
+  rhs[dof_ids[free]] = loads[:, 1:3][free]
+  solution = lu.solve(rhs)
+  displacements = np.where(bc_array == -1, 0.0, solution[bc_array])
+  return {
+    "nodes": len(nodes), "band": band, "profile": profile,
+    "natural": natural, "colamd": (colamd_time, colamd_fill),
+    "displacements": generator.toOriginalOrder(displacements),
+  }
+
+if __name__ == '__main__':
+  print(f"{'mesh':>8} {'order':>6} {'nodes':>6} {'band':>6} {'profile':>9} {'natural (s)':>11} {'fill':>9} {'colamd (s)':>10} {'fill':>9}")
+  for scale in (SCALE, 2 * SCALE):
+    results = {}
+    for renumber in (False, True):
+      r = results[renumber] = run(scale, renumber)
+      natural = f"{r['natural'][0]:>11.3f} {r['natural'][1]:>9}" if r["natural"] else f"{'-':>11} {'-':>9}"
+      print(f"{'x' + str(scale // SCALE):>8} {'rcm' if renumber else 'gmsh':>6} {r['nodes']:>6} {r['band']:>6} {r['profile']:>9} "
+            f"{natural} {r['colamd'][0]:>10.3f} {r['colamd'][1]:>9}")
+    difference = np.abs(results[True]["displacements"] - results[False]["displacements"]).max()
+    print(f"{'':>8} largest displacement difference between the orders: {difference:.2e}")
@@ -0,0 +1,204 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import contextlib
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import pygame
+import instrument
+import solver
+from canvas import Canvas
+from mesh import MeshGenerator
+
+"""Scaling benchmark of the whole pipeline on synthetic inputs. Every case draws a black plate
+on a white image holding a grid of holes; each hole holds nested rings of alternating color
+(every ring is one more material) and the ring outlines can be wavy to add contour points.
+The cases grow the resolution, the number of holes (islands), the nesting depth, the contour
+complexity and the mesh density one at a time.
+
+Each stage is timed on its own, through the instrument stages of the pipeline (thresholding
+and contours, gmsh geometry and meshing, mesh read and renumbering, layer rendering, assembly,
+factorization and solve) plus the boundary selection queries and the canvas frames (first
+frame composing the layers, then panned frames). The best time of a few repeats is kept.
+
+  python benchmarks/bench_scaling.py [--quick] [--repeat 3]
+  python benchmarks/bench_scaling.py --save      # record the baseline of this machine
+  python benchmarks/bench_scaling.py --compare   # flag the stages slower than the baseline
+
+The baseline is a JSON file (benchmarks/baselines/scaling.json by default) holding the stage
+times of every case. A stage is flagged as a regression when it is slower than its baseline
+by more than the threshold (and by more than NOISE_FLOOR seconds); the script then exits
+with status 1, so it can gate a change.
+"""
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(ROOT, "baselines", "scaling.json")
+
+# Relative slowdown flagged as a regression
+THRESHOLD = 0.25
+# Stages differing by less than this (seconds) are never flagged, whatever the ratio
+NOISE_FLOOR = 0.002
+
+# Number of random selection boxes and panned canvas frames timed per case
+QUERIES = 1000
+FRAMES = 20
+
+# name, image size, holes per side, rings per hole, contour waves, mesh scale
+CASES = [
+  ("base",       512, 2, 2,  0,  50),
+  ("size-1024", 1024, 2, 2,  0,  50),
+  ("size-2048", 2048, 2, 2,  0,  50),
+  ("holes-4",    512, 4, 2,  0,  50),
+  ("holes-8",    512, 8, 2,  0,  50),
+  ("depth-4",    512, 2, 4,  0,  50),
+  ("depth-8",    512, 2, 8,  0,  50),
+  ("waves-8",    512, 2, 2,  8,  50),
+  ("waves-32",   512, 2, 2, 32,  50),
+  ("scale-100",  512, 2, 2,  0, 100),
+  ("scale-200",  512, 2, 2,  0, 200),
+]
+QUICK = ["base", "size-1024", "holes-4", "depth-4", "waves-8", "scale-100"]
+
+"""Synthetic input image (BGR, size x size): a black plate with holes x holes round holes,
+each filled with rings nested rings of alternating color, their radius modulated by waves
+periods along the outline"""
+def syntheticImage(size, holes, rings, waves):
+  image = np.full((size, size, 3), 255, dtype=np.uint8)
+  margin = size // 16
+  cv2.rectangle(image, (margin, margin), (size - margin, size - margin), (0, 0, 0), -1)
+  pitch = (size - 2 * margin) / holes
+  angles = np.linspace(0, 2 * np.pi, 720, endpoint=False)
+  for i in range(holes):
+    for j in range(holes):
+      center = margin + pitch * (np.array([i, j]) + 0.5)
+      for ring in range(rings):
+        radius = 0.4 * pitch * (1 - ring / rings) * (1 + 0.08 * np.sin(waves * angles))
+        outline = center + radius[:, None] * np.column_stack((np.cos(angles), np.sin(angles)))
+        color = (255, 255, 255) if ring % 2 == 0 else (0, 0, 0)
+        cv2.fillPoly(image, [np.round(outline).astype(np.int32)], color)
+  return image
+
+"""Clamp the bottom edge of the plate and push down on its top edge"""
+def applyLoads(generator):
+  coords = generator.boundary.coords
+  low, high = coords[:, 1].min(), coords[:, 1].max()
+  band = 0.02 * (high - low)
+  xmin, xmax = coords[:, 0].min(), coords[:, 0].max()
+  generator.boundary.applyConstraints(generator.getSelection((xmin, low, xmax, low + band)), x=True, y=True)
+  generator.boundary.setForces(generator.getSelection((xmin, high - band, xmax, high)), 0.0, -1.0)
+
+def timeSelection(generator, rng):
+  xy = rng.uniform(0, [generator.width, generator.height], (QUERIES, 2))
+  extent = rng.uniform(0.02, 0.3, (QUERIES, 2)) * [generator.width, generator.height]
+  start = time.perf_counter()
+  for (x, y), (w, h) in zip(xy, extent):
+    generator.getSelection((x, y, x + w, y + h))
+  return time.perf_counter() - start
+
+def timeFrames(generator, image):
+  screen = pygame.Surface((640, 480))
+  canvas = Canvas((generator.width, generator.height))
+  canvas.setLayers([image, generator.patches_plot, generator.boundary_plot])
+  start = time.perf_counter()
+  canvas.end(screen)
+  compose = time.perf_counter() - start
+  start = time.perf_counter()
+  for frame in range(FRAMES):
+    canvas.origin = (frame * 3, frame * 2)
+    canvas.end(screen)
+  return compose, (time.perf_counter() - start) / FRAMES
+
+"""Stage times (seconds) and sizes of one run of a case"""
+def runCase(path, scale, rng):
+  instrument.drain()
+  with contextlib.redirect_stdout(open(os.devnull, "w")):
+    generator = MeshGenerator(path, scale=scale, cache=None)
+  applyLoads(generator)
+  nodes, elements, loads, mats = generator.getModel([[100, 0.3]] * len(generator.patches_plot_legend))
+  solver.clearCache()
+  solver.solve(nodes, elements, loads, mats)
+
+  times = {}
+  for record in instrument.drain():
+    times[record["name"]] = times.get(record["name"], 0.0) + record["duration"]
+  times["selection"] = timeSelection(generator, rng)
+  image = pygame.image.frombuffer(cv2.flip(cv2.imread(path), 0)[:, :, ::-1].tobytes(), (generator.width, generator.height), "RGB")
+  times["first frame"], times["panned frame"] = timeFrames(generator, image)
+  sizes = {"nodes": len(nodes), "elements": len(elements), "materials": len(generator.patches_plot_legend),
+           "boundary points": len(generator.boundary)}
+  return times, sizes
+
+def runSuite(cases, repeat):
+  rng = np.random.default_rng(0)
+  results = {}
+  with tempfile.TemporaryDirectory() as tmp:
+    for name, size, holes, rings, waves, scale in cases:
+      path = os.path.join(tmp, f"{name}.png")
+      cv2.imwrite(path, syntheticImage(size, holes, rings, waves))
+      best = None
+      for _ in range(repeat):
+        times, sizes = runCase(path, scale, rng)
+        best = times if best is None else {k: min(v, best.get(k, v)) for k, v in times.items()}
+      results[name] = {"sizes": sizes, "times": best}
+      print(f"[Scaling] {name}: {sizes['elements']} elements, {sizes['materials']} materials, {sum(best.values()):.2f}s", file=sys.stderr)
+  return results
+
+def printTable(results):
+  stages = list(dict.fromkeys(k for r in results.values() for k in r["times"]))
+  print(f"{'case':>10} {'elements':>9} {'mats':>5} " + " ".join(f"{s[:12]:>12}" for s in stages))
+  for name, r in results.items():
+    print(f"{name:>10} {r['sizes']['elements']:>9} {r['sizes']['materials']:>5} "
+          + " ".join(f"{r['times'].get(s, float('nan')) * 1e3:>12.1f}" for s in stages))
+  print("(stage times in ms; selection is the total of", QUERIES, "queries, frames are per frame)")
+
+"""Stages of the results slower than the baseline beyond the threshold: (case, stage, baseline, now)"""
+def regressions(results, baseline, threshold):
+  found = []
+  for name, r in results.items():
+    reference = baseline["cases"].get(name)
+    if reference is None:
+      continue
+    for stage, seconds in r["times"].items():
+      before = reference["times"].get(stage)
+      if before is not None and seconds > before * (1 + threshold) and seconds - before > NOISE_FLOOR:
+        found.append((name, stage, before, seconds))
+  return found
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="Scaling benchmark on synthetic multi-material inputs")
+  parser.add_argument("--quick", action="store_true", help="run a subset of the cases")
+  parser.add_argument("--repeat", type=int, default=3, help="runs per case, the best time of each stage is kept")
+  parser.add_argument("--baseline", default=BASELINE, help="baseline file")
+  parser.add_argument("--save", action="store_true", help="write the results as the baseline")
+  parser.add_argument("--compare", action="store_true", help="compare with the baseline and flag regressions")
+  parser.add_argument("--threshold", type=float, default=THRESHOLD, help="relative slowdown flagged as a regression")
+  args = parser.parse_args()
+
+  # stage times only: tracing the allocations would slow down the stages being measured
+  instrument.enable(None, memory=False)
+  cases = [c for c in CASES if not args.quick or c[0] in QUICK]
+  results = runSuite(cases, max(1, args.repeat))
+  printTable(results)
+
+  status = 0
+  if args.compare:
+    with open(args.baseline) as f:
+      baseline = json.load(f)
+    found = regressions(results, baseline, args.threshold)
+    for name, stage, before, now in found:
+      print(f"REGRESSION {name} / {stage}: {before * 1e3:.1f} ms -> {now * 1e3:.1f} ms ({now / before:.2f}x)")
+    print(f"{len(found)} regressions beyond {args.threshold:.0%} against {args.baseline} ({baseline['machine']})")
+    status = 1 if found else 0
+  if args.save:
+    os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+    with open(args.baseline, "w") as f:
+      json.dump({"machine": f"{platform.node()} {platform.machine()} {platform.python_version()}",
+                 "date": time.strftime("%Y-%m-%d"), "repeat": args.repeat, "cases": results}, f, indent=1)
+    print(f"baseline written to {args.baseline}")
+  sys.exit(status)
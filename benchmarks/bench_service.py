@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+import base64
+import tempfile
+import threading
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import service
+
+"""Latency of the local solve service. Starts it on a free localhost port with a fresh mesh
+cache, submits a job on a new image (uploaded as base64), then jobs with new loads on the mesh
+it built, first with the same constraints (cached factorization, back-substitution only) and
+then with moved constraints (refactorization). Prints the end to end latency and the cache
+hits of every job, then the metrics of the service.
+
+  python benchmarks/bench_service.py [image] [loads]
+"""
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+IMAGE = os.path.join(ROOT, "inputs", "skull.png")
+
+def timedSolve(client, spec):
+  start = time.perf_counter()
+  status, arrays = client.solve(spec, timeout=600)
+  return time.perf_counter() - start, status, arrays
+
+def report(label, seconds, status):
+  hits = ", ".join(f"{k[:-4]} {'hit' if status[k] else 'miss'}" for k in ("mesh_memory_hit", "mesh_disk_hit", "system_hit")
+                   if status.get(k) is not None)
+  print(f"{label:<28} {seconds * 1e3:>9.1f} ms  {status['elements']:>6} elements  {hits}")
+
+if __name__ == '__main__':
+  image = sys.argv[1] if len(sys.argv) > 1 else IMAGE
+  count = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+  with tempfile.TemporaryDirectory() as tmp:
+    # a cold disk cache, shared by the workers
+    os.environ["BOXINGFEM_CACHE"] = os.path.join(tmp, "cache")
+    server = service.ServiceServer(port=0, workers=2, directory=tmp)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = service.Client(f"http://127.0.0.1:{server.server_address[1]}")
+    try:
+      with open(image, "rb") as f:
+        data = base64.b64encode(f.read()).decode()
+      base = {"materials": [[100, 0.1], [10, 0.4]], "constraints": [{"bbox": [0, 0, 200, 5], "x": True, "y": True}]}
+
+      seconds, status, arrays = timedSolve(client, dict(base, image_data=data, forces=[{"bbox": [0, 150, 200, 170], "fy": -4}]))
+      report("new image", seconds, status)
+      mesh = status["mesh"]
+      for fy in np.linspace(-1, -8, count):
+        seconds, status, arrays = timedSolve(client, dict(base, mesh=mesh, forces=[{"bbox": [0, 150, 200, 170], "fy": float(fy)}]))
+        report(f"new loads (fy={fy:.2f})", seconds, status)
+      for shift in range(1, count + 1):
+        moved = [{"bbox": [0, 0, 200, 5 + shift], "x": True, "y": True}]
+        seconds, status, arrays = timedSolve(client, dict(base, mesh=mesh, constraints=moved, forces=[{"bbox": [0, 150, 200, 170], "fy": -4}]))
+        report(f"new constraints (+{shift})", seconds, status)
+      print(f"result arrays: {', '.join(sorted(arrays))}")
+
+      metrics = client.metrics()
+      print(f"jobs {metrics['jobs']}, queue depth {metrics['queue_depth']}, {metrics['meshes']} meshes")
+      for stage, s in metrics["latency"].items():
+        print(f"  {stage:<20} n={s['count']:<3} mean {s['mean'] * 1e3:>8.1f} ms  p50 {s['p50'] * 1e3:>8.1f}  p95 {s['p95'] * 1e3:>8.1f}")
+      for name, c in metrics["cache"].items():
+        print(f"  {name:<20} {c['hits']} hits / {c['misses']} misses")
+    finally:
+      server.shutdown()
+      server.server_close()
@@ -0,0 +1,59 @@
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import solver
+from mesh import MeshGenerator
+
+"""Benchmark of the contour simplification. Every image is meshed with the raw contours, the
+simplified ones and splines, and the geometry, element count and meshing time are compared.
+Every mesh is also solved (bottom edge clamped, top edge pushed down): the script exits with
+status 1 when a solve fails or gives non finite displacements, e.g. on nodes no element uses.
+
+  python benchmarks/bench_simplify.py [images...]
+"""
+
+def mesh(path, **kwargs):
+  start = time.perf_counter()
+  generator = MeshGenerator(path, cache=None, **kwargs)
+  return generator, time.perf_counter() - start
+
+"""Clamp the bottom edge, push down on the top edge and solve. Returns the largest displacement."""
+def solve(generator):
+  coords = generator.boundary.coords
+  low, high = coords[:, 1].min(), coords[:, 1].max()
+  band = 0.02 * (high - low)
+  xmin, xmax = coords[:, 0].min(), coords[:, 0].max()
+  generator.boundary.applyConstraints(generator.getSelection((xmin, low, xmax, low + band)), x=True, y=True)
+  generator.boundary.setForces(generator.getSelection((xmin, high - band, xmax, high)), 0.0, -1.0)
+  nodes, elements, loads, mats = generator.getModel([[100, 0.3]] * len(generator.patches_plot_legend))
+  displacements = solver.solve(nodes, elements, loads, mats).displacements
+  if not np.isfinite(displacements).all():
+    raise ValueError("non finite displacements")
+  return np.abs(displacements).max()
+
+if __name__ == '__main__':
+  root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+  images = sys.argv[1:] or [os.path.join(root, "inputs", "skull.png"), os.path.join(root, "inputs", "test.png")]
+
+  rows = []
+  failures = []
+  for path in images:
+    for name, kwargs in (("raw", {"simplify": 0, "min_area": 0}), ("simplified", {}), ("spline", {"spline": True})):
+      generator, t = mesh(path, **kwargs)
+      report = generator.geometry_report
+      try:
+        solved = f"{solve(generator):.3g}"
+      except Exception as e:
+        solved = "failed"
+        failures.append(f"{os.path.basename(path)} {name}: {type(e).__name__}: {e}")
+      rows.append((os.path.basename(path), name, report["contours_kept"], report["points_kept"], len(generator.elements), t, solved))
+
+  print(f"{'image':>12} {'contours':>11} {'contours':>9} {'points':>7} {'elements':>9} {'time (s)':>9} {'max disp':>9}")
+  for row in rows:
+    print(f"{row[0]:>12} {row[1]:>11} {row[2]:>9} {row[3]:>7} {row[4]:>9} {row[5]:>9.3f} {row[6]:>9}")
+  for failure in failures:
+    print("FAIL solve " + failure)
+  sys.exit(1 if failures else 0)
@@ -0,0 +1,50 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import solver
+from batch import applyBoundaryConditions
+from mesh import MeshGenerator, SCALE
+
+"""Benchmark of the adaptive mesh sizing. The skull example is clamped at the bottom and
+loaded at the top, then solved on uniform meshes (SCALE and a twice finer reference) and on
+graded meshes. Element count, solve time and the peak von Mises stress are reported, the
+error being relative to the fine uniform reference.
+
+  python benchmarks/bench_sizing.py
+"""
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+SPEC = {
+  "image": os.path.join(ROOT, "inputs", "skull.png"),
+  "materials": [[100, 0.1], [10, 0.4]],
+  "constraints": [{"bbox": [0, 0, 200, 5], "x": True, "y": True}],
+  "forces": [{"bbox": [80, 150, 110, 170], "fx": 0, "fy": -4}],
+}
+
+CASES = [
+  ("uniform", {}),
+  ("uniform x2 (reference)", {"scale": 2 * SCALE}),
+  ("graded 0.5-2", {"min_size": 0.5, "max_size": 2}),
+  ("graded 0.5-4", {"min_size": 0.5, "max_size": 4}),
+  ("graded 0.35-4", {"min_size": 0.35, "max_size": 4}),
+]
+
+def run(kwargs):
+  refine = [c["bbox"] for c in SPEC["constraints"] + SPEC["forces"]]
+  generator = MeshGenerator(SPEC["image"], cache=None, refine=refine, **kwargs)
+  applyBoundaryConditions(generator, SPEC)
+  model = generator.getModel(SPEC["materials"])
+  solver.clearCache()
+  start = time.perf_counter()
+  fields = solver.solve(*model)
+  return len(generator.elements), time.perf_counter() - start, fields.von_mises.max()
+
+if __name__ == '__main__':
+  results = [(name,) + run(kwargs) for name, kwargs in CASES]
+  reference = results[1][3]
+  print(f"{'mesh':>24} {'elements':>9} {'solve (s)':>10} {'peak VM':>9} {'error':>7}")
+  for name, elements, t, peak in results:
+    print(f"{name:>24} {elements:>9} {t:>10.3f} {peak:>9.4f} {abs(peak - reference) / reference:>7.1%}")
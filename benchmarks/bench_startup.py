@@ -0,0 +1,99 @@
+import os
+import sys
+import subprocess
+
+"""Startup import budget. Imports boxingfem (everything loaded before the file dialog shows
+up) in a fresh interpreter under -X importtime, and checks that its cumulative import time
+stays within BUDGET. A separate fresh interpreter imports every GUI module and asserts that
+none of the DEFERRED packages was loaded on the way. The import time of the modules loaded
+later, on first use, is listed too. Exits with status 1 when the budget is exceeded, a
+deferred package is imported at startup or a child interpreter fails (e.g. a broken import).
+
+  python benchmarks/bench_startup.py [budget in ms]
+"""
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Cumulative import time (ms) allowed for boxingfem, best of RUNS fresh interpreters. The
+# imports take 250 to 400 ms here, the budget leaves room for slower or busy machines; a
+# deferred package moving back onto the startup path is caught by the DEFERRED check instead
+BUDGET = 800
+RUNS = 3
+
+# Modules imported by the GUI before the file dialog
+GUI_MODULES = ["boxingfem", "mesh", "canvas", "overlay", "resultlayers", "ui", "selectionbox", "raster", "boundary"]
+
+# Packages only imported when their stage first needs them
+DEFERRED = ["matplotlib", "scipy", "gmsh", "solidspy"]
+
+# Modules loaded on first use after startup: meshing, first solve, time stepping, export, plots
+FIRST_USE = ["gmsh", "matplotlib.cm", "solver", "timestep", "modelio", "matplotlib.pyplot", "solidspy.postprocesor"]
+
+"""Failure of a child interpreter, with the last line of its error output"""
+class ChildFailure(Exception):
+  pass
+
+"""Run Python code in a fresh interpreter from the repository root. Raises ChildFailure when it
+exits with an error."""
+def runChild(code, *options):
+  env = dict(os.environ, SDL_VIDEODRIVER=os.environ.get("SDL_VIDEODRIVER", "dummy"), PYGAME_HIDE_SUPPORT_PROMPT="1")
+  run = subprocess.run([sys.executable, *options, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True)
+  if run.returncode != 0:
+    errors = [line for line in run.stderr.splitlines() if not line.startswith("import time:")]
+    raise ChildFailure(errors[-1] if errors else f"exit status {run.returncode}")
+  return run
+
+"""Cumulative import times (ms) of the modules imported by the code, in a fresh interpreter
+started after the given setup imports, by nesting depth: {depth: {module: ms}}"""
+def importTimes(code, setup = ""):
+  run = runChild(f"{setup}\n{code}", "-X", "importtime")
+  times = {}
+  for line in run.stderr.splitlines():
+    if not line.startswith("import time:") or "cumulative" in line:
+      continue
+    _, cumulative, name = line[len("import time:"):].split("|")
+    depth = (len(name) - len(name.lstrip()) - 1) // 2
+    times.setdefault(depth, {})[name.strip()] = int(cumulative) / 1e3
+  return times
+
+"""Import the GUI modules in a fresh interpreter, which asserts that none of the deferred
+packages is loaded. Raises ChildFailure otherwise, or when an import fails."""
+def checkDeferred():
+  runChild("\n".join([
+    "import sys",
+    f"import {', '.join(GUI_MODULES)}",
+    f"loaded = sorted({{m.split('.')[0] for m in sys.modules}} & {set(DEFERRED)!r})",
+    "assert not loaded, 'imported at startup: ' + ', '.join(loaded)",
+  ]))
+
+if __name__ == '__main__':
+  budget = float(sys.argv[1]) if len(sys.argv) > 1 else BUDGET
+  failures = []
+  try:
+    checkDeferred()
+  except ChildFailure as e:
+    failures.append(f"GUI modules: {e}")
+
+  try:
+    startup = [importTimes("import boxingfem") for _ in range(RUNS)]
+  except ChildFailure as e:
+    failures.append(f"import boxingfem: {e}")
+  else:
+    total = min(t[0]["boxingfem"] for t in startup)
+    print(f"boxingfem import (time to file dialog): {total:.0f} ms, budget {budget:.0f} ms")
+    heaviest = sorted(startup[0][1].items(), key=lambda item: -item[1])[:5]
+    print("  heaviest imports: " + ", ".join(f"{name} {ms:.0f} ms" for name, ms in heaviest))
+    if total > budget:
+      failures.append(f"startup imports take {total:.0f} ms, over the {budget:.0f} ms budget")
+
+    for module in FIRST_USE:
+      try:
+        ms = importTimes(f"import {module}", setup="import boxingfem")[0].get(module, 0.0)
+        print(f"  on first use: {module:<22} {ms:>6.0f} ms")
+      except ChildFailure as e:
+        failures.append(f"import {module}: {e}")
+
+  for failure in failures:
+    print("FAIL " + failure)
+  print("OK" if not failures else f"{len(failures)} failures")
+  sys.exit(1 if failures else 0)
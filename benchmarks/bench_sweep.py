@@ -0,0 +1,51 @@
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import sweep
+from assembly import Assembly
+from batch import applyBoundaryConditions
+from mesh import MeshGenerator, SCALE
+
+"""Benchmark of the material parameter sweep on the skull example at twice the default
+resolution, sweeping the Young's modulus of the second material. Reports the time to form one
+stiffness matrix by full assembly and from the per material decomposition, then the sweep
+throughput (samples per second) for growing numbers of worker processes.
+
+  python benchmarks/bench_sweep.py [samples]
+"""
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+SPEC = {
+  "image": os.path.join(ROOT, "inputs", "skull.png"),
+  "materials": [[100, 0.1], [10, 0.4]],
+  "constraints": [{"bbox": [0, 0, 200, 5], "x": True, "y": True}],
+  "forces": [{"bbox": [80, 150, 110, 170], "fx": 0, "fy": -4}],
+}
+
+def timed(function, *args, **kwargs):
+  start = time.perf_counter()
+  function(*args, **kwargs)
+  return time.perf_counter() - start
+
+if __name__ == '__main__':
+  count = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+  generator = MeshGenerator(SPEC["image"], scale=2 * SCALE)
+  applyBoundaryConditions(generator, SPEC)
+  nodes, elements, loads, mats = generator.getModel(SPEC["materials"])
+  samples = sweep.materialSamples(mats, 1, np.geomspace(1, 100, count), [0.4])
+
+  assembly = Assembly(nodes, elements)
+  decomposition = sweep.MaterialDecomposition(nodes, elements, loads)
+  full = np.mean([timed(assembly.stiffness, nodes[:, 1:3], s) for s in samples[:8]])
+  combined = np.mean([timed(decomposition.matrix, s) for s in samples[:8]])
+  print(f"{len(elements)} elements, {count} samples")
+  print(f"stiffness matrix: full assembly {full * 1e3:.2f} ms, decomposition {combined * 1e3:.2f} ms")
+
+  print(f"{'workers':>8} {'time (s)':>9} {'samples/s':>10}")
+  for workers in sorted({1, 2, os.cpu_count() or 1}):
+    elapsed = timed(sweep.sweep, nodes, elements, loads, samples, workers=workers)
+    print(f"{workers:>8} {elapsed:>9.2f} {count / elapsed:>10.2f}")
@@ -0,0 +1,47 @@
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import modelio
+from solver import FactorizedSystem
+from timestep import TimeStepper
+
+"""Benchmark of the updated-Lagrangian time stepping on the model saved in a solidspy text
+folder. Prints the time of every step split into assembly, factorization, conjugate gradient
+solve and update, with the iteration count and the number of element matrices computed again,
+then compares the average step with rebuilding and factorizing the whole system every step.
+
+  python benchmarks/bench_timestep.py [folder] [steps]
+"""
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+if __name__ == '__main__':
+  folder = sys.argv[1] if len(sys.argv) > 1 else os.path.join(ROOT, "data")
+  steps = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+  nodes, elements, loads, mats = modelio.readText(folder)
+
+  stepper = TimeStepper(nodes, elements, loads, mats)
+  print(f"{len(nodes)} nodes, {len(elements)} elements")
+  print(f"{'step':>5} {'assemble':>9} {'factorize':>10} {'solve':>8} {'update':>8} {'total (ms)':>11} {'iterations':>11} {'updated':>8}")
+  totals = []
+  for _ in range(steps):
+    frame = stepper.step()
+    t = frame.timings
+    totals.append(sum(t.values()))
+    print(f"{frame.step:>5} {t['assemble'] * 1e3:>9.1f} {t['factorize'] * 1e3:>10.1f} {t['solve'] * 1e3:>8.1f} {t['update'] * 1e3:>8.1f} "
+          f"{totals[-1] * 1e3:>11.1f} {frame.iterations:>11} {frame.updated:>8}")
+
+  # the same steps, building and factorizing the system of every deformed geometry from scratch
+  coords = nodes[:, 1:3].copy()
+  start = time.perf_counter()
+  for _ in range(steps):
+    deformed = np.column_stack((nodes[:, 0], coords, nodes[:, 3:5]))
+    coords += FactorizedSystem(deformed, elements, mats).displacements([loads])[0]
+  full = (time.perf_counter() - start) / steps
+
+  print(f"average step {np.mean(totals) * 1e3:.1f} ms ({1 / np.mean(totals):.1f} steps/s), "
+        f"refactorizing every step {full * 1e3:.1f} ms")
+  print(f"largest difference of the final positions {np.abs(coords - frame.coords).max():.1e}")
@@ -0,0 +1,93 @@
+import numpy as np
+
+# Average number of points per cell of the spatial index
+POINTS_PER_CELL = 4
+
+"""Boundary conditions of the boundary nodes, stored as a structure of arrays:
+  ids          (n,) node index of each boundary point
+  coords       (n, 2) node coordinates
+  constraints  (n, 2) x/y constraint flags (-1: constrained, 0: free)
+  forces       (n, 2) x/y forces
+Rows are addressed by index arrays, such as the ones returned by query. The points are
+bucketed in a uniform grid so that a bounding box query only looks at the cells it overlaps.
+"""
+class BoundaryTable:
+  def __init__(self, ids, coords):
+    self.ids = np.asarray(ids, dtype=int)
+    self.coords = np.reshape(np.asarray(coords, dtype=float), (-1, 2))
+    self.constraints = np.zeros((len(self.ids), 2), dtype=int)
+    self.forces = np.zeros((len(self.ids), 2))
+    self.buildIndex()
+
+  def __len__(self):
+    return len(self.ids)
+
+  def buildIndex(self):
+    if len(self.coords) == 0:
+      self.low = np.zeros(2)
+      self.cell = 1.0
+      self.shape = (1, 1)
+      self.order = np.zeros(0, dtype=int)
+      self.starts = np.zeros(2, dtype=int)
+      return
+    self.low = self.coords.min(axis=0)
+    extent = np.maximum(self.coords.max(axis=0) - self.low, 1e-9)
+    self.cell = max(np.sqrt(extent[0] * extent[1] * POINTS_PER_CELL / len(self.coords)), extent.max() / 1024, 1e-9)
+    self.shape = tuple((extent // self.cell).astype(int) + 1)
+
+    cells = self.cellOf(self.coords)
+    linear = cells[:, 1] * self.shape[0] + cells[:, 0]
+    self.order = np.argsort(linear, kind="stable")
+    # points of cell c are order[starts[c]:starts[c + 1]]
+    self.starts = np.searchsorted(linear[self.order], np.arange(self.shape[0] * self.shape[1] + 1))
+
+  def cellOf(self, xy):
+    cells = np.floor((np.reshape(xy, (-1, 2)) - self.low) / self.cell).astype(int)
+    return np.clip(cells, 0, np.array(self.shape) - 1)
+
+  """Rows of the points inside bbox = (xmin, ymin, xmax, ymax), bounds included"""
+  def query(self, bbox):
+    xmin, ymin, xmax, ymax = bbox
+    if len(self.ids) == 0 or xmax < self.low[0] or ymax < self.low[1]:
+      return np.zeros(0, dtype=int)
+    (cx0, cy0), (cx1, cy1) = self.cellOf([(xmin, ymin), (xmax, ymax)])
+    # the cells cx0..cx1 of one grid row are contiguous in the sorted order
+    rows = np.arange(cy0, cy1 + 1) * self.shape[0]
+    begin = self.starts[rows + cx0]
+    end = self.starts[rows + cx1 + 1]
+    lengths = end - begin
+    candidates = self.order[np.repeat(begin - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())]
+
+    xy = self.coords[candidates]
+    inside = (xy[:, 0] >= xmin) & (xy[:, 0] <= xmax) & (xy[:, 1] >= ymin) & (xy[:, 1] <= ymax)
+    return np.sort(candidates[inside])
+
+  def applyConstraints(self, rows, x = False, y = False):
+    if x:
+      self.constraints[rows, 0] = -1
+    if y:
+      self.constraints[rows, 1] = -1
+
+  def clearConstraints(self, rows):
+    self.constraints[rows] = 0
+
+  def setForces(self, rows, fx, fy):
+    self.forces[rows] = (fx, fy)
+
+  def clearForces(self, rows):
+    self.forces[rows] = 0
+
+  """Rows carrying a non zero force"""
+  def loaded(self):
+    return np.flatnonzero((self.forces != 0).any(axis=1))
+
+  """Write the constraint flags into the (nnodes, 2) constraint array of the whole mesh"""
+  def exportConstraints(self, constraints):
+    constraints[:] = 0
+    constraints[self.ids] = self.constraints
+    return constraints
+
+  """Loads in the solidspy layout [node, x-force, y-force]"""
+  def exportLoads(self):
+    rows = self.loaded()
+    return np.column_stack((self.ids[rows], self.forces[rows]))
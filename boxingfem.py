@@ -1,21 +1,27 @@
+import os
+import sys
 import tkinter
 import tkinter.filedialog
 import numpy as np
 import pygame
-from solidspy.solids_GUI import solids_GUI
-import tkinter
-import tkinter.ttk
-import time
-import subprocess
 
-from mesh import MeshGenerator
+from mesh import MeshPipeline
 from canvas import Canvas
+from overlay import MarkerOverlay, constraintColors
+from resultlayers import ResultLayers, FIELDS
 from ui import UIPanel
 from selectionbox import SelectionBox
 
+# The solver (scipy), the time stepping and the result plots (solidspy, matplotlib) are
+# imported on first use, so that the file dialog and the first frame do not wait for them
+
 # Running indicator
 running = False
 
+# Frame rate caps of the main loop, while the view changes and while idle
+FPS = 60
+IDLE_FPS = 15
+
 """Create a Tk file dialog and cleanup when finished"""
 def prompt_file():
     top = tkinter.Tk()
@@ -29,30 +35,18 @@ def quit_callback():
   global running
   running = False
 
-"""Helper function for drawing boundary points on canvas"""
-def drawBoundaryPoints(generator, canvas, screen):
-  def getColor(x_constraint, y_constraint):
-    if x_constraint < 0 and y_constraint < 0:
-      return (0, 255, 255)
-    if x_constraint < 0 and y_constraint == 0:
-      return (0, 255, 128)
-    if x_constraint == 0 and y_constraint < 0:
-      return (0, 128, 255)
-    return (0, 128, 128)
-  
-  def transformPose(x, y):
-    return (x * canvas.zoom + canvas.origin[0], (size[1] - y) * canvas.zoom + canvas.origin[1])
-
-  for b in generator.boundary_points:
-    pygame.draw.circle(screen, getColor(b[2], b[3]), transformPose(b[1][0], b[1][1]), 5, 0)
-
-    if b[4] != 0 or b[5] != 0:
-      pygame.draw.line(screen, (251, 206, 177), transformPose(b[1][0], b[1][1]), transformPose(b[1][0] + b[4] * canvas.zoom, b[1][1] + b[5] * canvas.zoom), 4)
-
-"""Helper function for drawing selected points on canvas"""
-def drawSelectedPoints(generator, canvas, screen, selected):
-  for b in selected:
-    pygame.draw.circle(screen, (255, 0, 0), (b[1][0] * canvas.zoom + canvas.origin[0], (size[1] - b[1][1]) * canvas.zoom + canvas.origin[1]), 3, 0)
+"""Render the boundary points (colored by their constraints) and their forces into the overlay"""
+def buildBoundaryOverlay(overlay, generator, canvas, screen_size):
+  zoom = canvas.zoom
+  table = generator.boundary
+  loaded = table.loaded()
+  segments = np.stack((table.coords[loaded], table.coords[loaded] + table.forces[loaded] * zoom), axis=1)
+  overlay.build(zoom, canvas.origin, screen_size, table.coords, constraintColors(table.constraints), 5, segments, (251, 206, 177), 4)
+
+"""Render the selected points (rows of the boundary table) into the overlay"""
+def buildSelectionOverlay(overlay, generator, selected, canvas, screen_size):
+  points = generator.boundary.coords[selected]
+  overlay.build(canvas.zoom, canvas.origin, screen_size, points, np.tile((255, 0, 0), (len(points), 1)), 3)
 
 """Helper function to make sure the rectangle is in the correct format"""
 def validRect(rect):
@@ -65,14 +59,52 @@ def validRect(rect):
     new_rect[3] = -new_rect[3]
   return tuple(new_rect)
 
-# Container holding the selected points
-selected_points = []
+"""Gather the model arrays (nodes, elements, loads, materials) from the boundary conditions
+and the material settings currently set in the UI"""
+def collectModel(generator, gui):
+  return generator.getModel([(p[0].get(), p[1].get()) for p in gui.patches_material])
+
+"""Show the stress, strain and displacement plots of a finished solve"""
+def showResults(generator, fields):
+  import matplotlib.pyplot as plt
+  import solidspy.postprocesor as pos
+  pos.fields_plot(generator.getElementsArray(), generator.getNodesArray(), fields.displacements, E_nodes=fields.strains, S_nodes=fields.stresses)
+  plt.show(block=False)
+
+# Rows of the boundary table holding the selected points
+selected_points = np.zeros(0, dtype=int)
+
+# Solve running in the background, if any
+pending_solve = None
+
+# Result field layers of the last solve or time step
+results = None
+
+# Time stepping running in the background, if any
+stepping = None
+
+# Background solver, started on the first Calculate
+solver = None
 
 if __name__ == '__main__':
+  if sys.argv[1:2] == ["batch"]:
+    import batch
+    sys.exit(batch.main(sys.argv[2:]))
+  if sys.argv[1:2] == ["sweep"]:
+    import sweep
+    sys.exit(sweep.main(sys.argv[2:]))
+  if sys.argv[1:2] == ["serve"]:
+    import service
+    sys.exit(service.main(sys.argv[2:]))
+
   pygame.init()
 
   path = prompt_file()
-  generator = MeshGenerator(path)
+  # The mesh is built in the background, its layers show up as they are ready
+  pipeline = MeshPipeline(path)
+  generator = None
+  patches_layer = None
+  boundary_layer = None
 
   image = pygame.image.load(path)
   image = pygame.transform.flip(image, False, True)
@@ -86,13 +118,27 @@ if __name__ == '__main__':
   canvas = Canvas(size)
 
   gui = UIPanel(quit_callback)
-  gui.setPatchesLegend(generator.patches_plot_legend)
+  gui.addResultLayers(FIELDS)
+  gui.addPatchesLegend()
   gui.setPointsLegend()
   gui.setForceOptions()
   gui.setCalculation()
+  gui.setTimeStepping()
+  gui.setStatus()
     
   selection = SelectionBox()
 
+  boundary_overlay = MarkerOverlay(size[1])
+  selection_overlay = MarkerOverlay(size[1])
+  boundary_changed = True
+  selection_changed = True
+
+  clock = pygame.time.Clock()
+  full_redraw = True
+  selection_rect = None
+  points_visible = None
+  shown_field = None
+
   # run window
   running = True
   while running:
@@ -116,72 +162,173 @@ if __name__ == '__main__':
           selection.onMouseMove(pygame.mouse.get_pos())
         if event.type == pygame.MOUSEWHEEL:
           canvas.onMouseWheel(event.y)
+        if event.type in (pygame.VIDEORESIZE, pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+          full_redraw = True
 
-    screen.fill((255, 255, 255))
+    # Progress of the mesh generation
+    for event in pipeline.poll():
+      if event.stage == "failed":
+        gui.showStatus(f"Mesh generation failed: {event.error}")
+        print(f"Mesh generation failed: {event.error}")
+        continue
+      gui.showStatus(f"{event.stage} ({event.fraction:.0%}, {event.elapsed:.1f}s)")
+      if event.stage == "plot elements":
+        patches_layer = event.generator.patches_plot
+      elif event.stage == "plot boundaries":
+        boundary_layer = event.generator.boundary_plot
+        generator = event.generator
+        gui.setPatchesLegend(generator.patches_plot_legend)
+        boundary_changed = True
+        full_redraw = True
 
-    canvas.begin()
+    layers = []
     if gui.showOriginal.get():
-      canvas.getSurface().blit(image, (0, 0))
-    if gui.showPatches.get():
-      canvas.getSurface().blit(generator.patches_plot, (0, 0))
-    if gui.showBoundary.get():
-      canvas.getSurface().blit(generator.boundary_plot, (0, 0))
-    canvas.end(screen)
+      layers.append(image)
+    if gui.showPatches.get() and patches_layer is not None:
+      layers.append(patches_layer)
+    if gui.showBoundary.get() and boundary_layer is not None:
+      layers.append(boundary_layer)
+    field = gui.resultField.get()
+    if results is not None and field in FIELDS:
+      # only a new scale rasterizes the deformed mesh again, the fields are cached
+      results.setScale(round(gui.deformScale.get(), 2))
+      layers.append(results.layer(field))
+      if field != shown_field:
+        vmin, vmax = results.ranges[field]
+        gui.showStatus(f"{field}: {vmin:.4g} to {vmax:.4g}")
+    shown_field = field
+    canvas.setLayers(layers)
 
-    # Draw boundary points
-    if gui.showBoundaryPoints.get():
-      drawBoundaryPoints(generator, canvas, screen)
-      drawSelectedPoints(generator, canvas, screen, selected_points)
-    
-    # Draw selection box
-    if selection.isMouseDown: 
-      pygame.draw.rect(screen, (255, 0, 0), validRect((selection.mouseDownPos[0], 
-                                                       selection.mouseDownPos[1], 
-                                                       selection.currentMousePos[0] - selection.mouseDownPos[0], 
-                                                       selection.currentMousePos[1] - selection.mouseDownPos[1])), 2)
-      selected_points = generator.getSelection(selection.getSelectionBBox(canvas, size))
+    if gui.showBoundaryPoints.get() != points_visible:
+      points_visible = gui.showBoundaryPoints.get()
+      full_redraw = True
+
+    # Only the area under the old and new selection box changes while selecting
+    damaged = []
+    if selection.isMouseDown and generator is not None:
+      rect = pygame.Rect(validRect((selection.mouseDownPos[0], 
+                                    selection.mouseDownPos[1], 
+                                    selection.currentMousePos[0] - selection.mouseDownPos[0], 
+                                    selection.currentMousePos[1] - selection.mouseDownPos[1])))
+      if rect != selection_rect or canvas.dirty:
+        damaged += [r for r in (selection_rect, rect) if r is not None]
+        selection_rect = rect
+        selected_points = generator.getSelection(selection.getSelectionBBox(canvas, size))
+        selection_changed = True
+    elif selection_rect is not None:
+      damaged.append(selection_rect)
+      selection_rect = None
 
     # Read UI events
-    if gui.event == "apply-x":
-      for p in selected_points:
-        p[2] = -1
+    if generator is None and gui.event not in ("", "None"):
+      print("The mesh is not ready yet")
+    elif gui.event == "apply-x":
+      generator.boundary.applyConstraints(selected_points, x=True)
     elif gui.event == "apply-y":
-      for p in selected_points:
-        p[3] = -1
+      generator.boundary.applyConstraints(selected_points, y=True)
     elif gui.event == "clear-apply":
-      for p in selected_points:
-        p[2] = 0
-        p[3] = 0
+      generator.boundary.clearConstraints(selected_points)
     elif gui.event == "apply-force":
-      for p in selected_points:
-        p[4] = gui.forceX.get()
-        p[5] = gui.forceY.get()
+      generator.boundary.setForces(selected_points, gui.forceX.get(), gui.forceY.get())
     elif gui.event == "clear-force":
-      for p in selected_points:
-        p[4] = 0
-        p[5] = 0
+      generator.boundary.clearForces(selected_points)
     elif gui.event == "calculate":
+      if pending_solve is None:
+        print("Solving")
+        if solver is None:
+          from solver import Solver
+          solver = Solver()
+        pending_solve = solver.submit(*collectModel(generator, gui))
+    elif gui.event == "run-steps":
+      if stepping is not None:
+        stepping.stop()
+      print("Time stepping")
+      from timestep import StepPipeline
+      stepping = StepPipeline(*collectModel(generator, gui), gui.steps.get())
+      if gui.resultField.get() not in FIELDS:
+        gui.resultField.set("Displacement magnitude")
+    elif gui.event == "stop-steps":
+      if stepping is not None:
+        stepping.stop()
+    elif gui.event == "export":
       print("Writting files")
-      for p in generator.boundary_points:
-        generator.nodes_list[p[0]][3] = p[2]
-        generator.nodes_list[p[0]][4] = p[3]
-        if p[4] != 0 or p[5] != 0:
-          generator.loads_list.append([p[0], p[4], p[5]])
-      for p in gui.patches_material:
-        generator.mater_list.append([p[0].get(), p[1].get()])
-      
-      # Create files
-      np.savetxt("data/eles.txt", generator.eles_list, fmt="%d")
-      np.savetxt("data/nodes.txt", generator.nodes_list, fmt=("%d", "%.4f", "%.4f", "%d", "%d"))
-      np.savetxt("data/loads.txt", generator.loads_list, fmt=("%d", "%.6f", "%.6f"))
-      np.savetxt("data/mater.txt", generator.mater_list, fmt="%.6f")
-
+      import modelio
+      modelio.writeModel(os.path.join("data", modelio.MODEL_FILE), *collectModel(generator, gui))
       print("Done writting!")
-      time.sleep(0.1)
-      subprocess.call(['python','run_solidspy.py'])
+    if gui.event in ("apply-x", "apply-y", "clear-apply", "apply-force", "clear-force"):
+      boundary_changed = True
+    if gui.event:
+      full_redraw = True
+
+    # Pick up the result of the background solve
+    if pending_solve is not None and pending_solve.done():
+      try:
+        fields = pending_solve.result()
+        results = ResultLayers(size[0], size[1], generator.coords, generator.elements, fields)
+        shown_field = None
+        showResults(generator, fields)
+      except Exception as e:
+        print(f"Solve failed: {e}")
+      pending_solve = None
+
+    # Show the latest finished time step. Its displacements are the total from the undeformed
+    # mesh, drawn with the deformation scale like the result of a static solve
+    if stepping is not None:
+      frames = stepping.poll()
+      for frame in frames:
+        if isinstance(frame, Exception):
+          print(f"Time stepping failed: {frame}")
+        else:
+          timings = ", ".join(f"{k} {v * 1e3:.1f}" for k, v in frame.timings.items())
+          print(f"[Time Stepping] step {frame.step}: {frame.iterations} iterations, {frame.updated} elements updated, {timings} ms")
+      frames = [f for f in frames if not isinstance(f, Exception)]
+      if frames:
+        frame = frames[-1]
+        results = ResultLayers(size[0], size[1], generator.coords, generator.elements, frame.fields)
+        gui.showStatus(f"step {frame.step}: {sum(frame.timings.values()) * 1e3:.0f} ms, {frame.iterations} iterations")
+        shown_field = gui.resultField.get()
+      if not stepping.running() and not frames:
+        stepping = None
     
     gui.event = ""
 
-    pygame.display.update()
+    if not (full_redraw or canvas.dirty or damaged):
+      # Nothing changed, wait for input at a low rate
+      clock.tick(IDLE_FPS)
+      continue
+
+    # Redraw everything, or only the damaged area (the margin covers the point markers)
+    clip = None if full_redraw or canvas.dirty else damaged[0].unionall(damaged[1:]).inflate(12, 12)
+    screen.set_clip(clip)
+    screen.fill((255, 255, 255))
+    canvas.end(screen)
+
+    # Draw boundary points, the overlays are only rendered again when their content or their view changed
+    if points_visible and generator is not None:
+      if boundary_changed or not boundary_overlay.current(canvas.zoom, canvas.origin, screen.get_size()):
+        buildBoundaryOverlay(boundary_overlay, generator, canvas, screen.get_size())
+        boundary_changed = False
+      if selection_changed or not selection_overlay.current(canvas.zoom, canvas.origin, screen.get_size()):
+        buildSelectionOverlay(selection_overlay, generator, selected_points, canvas, screen.get_size())
+        selection_changed = False
+      boundary_overlay.draw(screen, canvas.origin)
+      selection_overlay.draw(screen, canvas.origin)
+    
+    # Draw selection box
+    if selection_rect is not None:
+      pygame.draw.rect(screen, (255, 0, 0), selection_rect, 2)
+
+    screen.set_clip(None)
+    if clip is None:
+      pygame.display.update()
+    else:
+      pygame.display.update(clip)
+    full_redraw = False
+
+    clock.tick(FPS)
 
+  if stepping is not None:
+    stepping.stop()
+  if solver is not None:
+    solver.shutdown()
   pygame.quit()
\ No newline at end of file
@@ -1,6 +1,40 @@
+import math
 import pygame
+from collections import OrderedDict
 
-"""Pygame canvas that allows pan and zoom"""
+# Levels of a layer pyramid are halved until their shorter side would drop below this
+PYRAMID_MIN_SIZE = 64
+
+# Scaled images larger than this many screens are only drawn for their visible part
+VIEWPORT_SCREENS = 4
+
+# Number of layer pyramids kept, for layers toggled off and on again
+PYRAMID_CACHE = 16
+
+"""Mipmap pyramid of a layer surface: level k is the layer flipped to screen orientation and
+scaled by 1 / 2^k, each level smoothscaled from the previous one"""
+def buildPyramid(surface):
+  levels = [pygame.transform.flip(surface, False, True)]
+  while min(levels[-1].get_size()) // 2 >= PYRAMID_MIN_SIZE:
+    width, height = levels[-1].get_size()
+    levels.append(pygame.transform.smoothscale(levels[-1], (width // 2, height // 2)))
+  return levels
+
+"""Level of a pyramid of count levels to draw at zoom: the smallest one still at least as
+large as the zoomed image, so that it is only ever scaled down by less than half"""
+def pyramidLevel(zoom, count):
+  if zoom >= 1:
+    return 0
+  return min(int(math.floor(math.log2(1 / zoom))), count - 1)
+
+"""Pygame canvas that allows pan and zoom. Every layer is kept as a mipmap pyramid (built once
+per layer), and the view is composed from the level closest to the zoom, so the full
+resolution layers are never scaled down as a whole. The composite is cached: while the
+zoomed image spans a few screens at most, it is scaled whole and panning only blits it at a
+new offset; past that (zooming into a large image), only the visible part of the level is
+cropped and scaled, again on every pan. dirty tells whether the canvas changed since it was
+last drawn.
+"""
 class Canvas:
   def __init__(self, surface_size):
     self.surface_size = surface_size
@@ -10,35 +44,104 @@ class Canvas:
     self.mouseDownPos = None
     self.isMouseDown = False
 
-  def begin(self):
-    self.surface = pygame.Surface(self.surface_size, pygame.HWSURFACE | pygame.DOUBLEBUF | pygame.RESIZABLE)
-    self.surface.fill((255, 255, 255))
+    self.layers = []
+    self.pyramids = OrderedDict()
+    self.composite = None
+    self.composite_key = None
+    self.composite_pos = (0, 0)
+    self.dirty = True
+
+  """Set the visible layers (surfaces of surface_size, bottom first). Layers are never drawn
+  into once shown: a changed layer is a new surface (see ResultLayers), so the cached
+  pyramids and composite follow the identity of the layers."""
+  def setLayers(self, layers):
+    if [id(l) for l in layers] != [id(l) for l in self.layers]:
+      self.layers = list(layers)
+      self.composite = None
+      self.dirty = True
 
-  def getSurface(self):
-    return self.surface
+  """Pyramid of a layer, kept with the layer itself so that its id stays unique while cached"""
+  def pyramid(self, layer):
+    key = id(layer)
+    if key in self.pyramids:
+      self.pyramids.move_to_end(key)
+    else:
+      self.pyramids[key] = (layer, buildPyramid(layer))
+      while len(self.pyramids) > PYRAMID_CACHE:
+        self.pyramids.popitem(last=False)
+    return self.pyramids[key][1]
 
   def transformPoints(self, points):
     return list(map(lambda p: (p[1] * self.zoom, p[0] * self.zoom), points))
 
+  """Screen rectangle covered by the canvas"""
+  def getRect(self):
+    return pygame.Rect(self.origin, (int(self.surface_size[0] * self.zoom), int(self.surface_size[1] * self.zoom)))
+
+  """Composite of the layers at the given level, over the area (level pixels) of the rect"""
+  def composeLevel(self, level, rect):
+    surface = pygame.Surface(rect.size)
+    surface.fill((255, 255, 255))
+    for layer in self.layers:
+      surface.blit(self.pyramid(layer)[level], (0, 0), rect)
+    return surface
+
+  """Build the composite of the zoomed layers: whole, or only over the visible part of the
+  screen. Returns its position on the screen.
+  """
+  def compose(self, rect, whole, screen_size):
+    count = min((len(self.pyramid(l)) for l in self.layers), default=1)
+    level = pyramidLevel(self.zoom, count)
+    scale = self.zoom * 2 ** level
+    full = pygame.Rect((0, 0), (max(1, self.surface_size[0] >> level), max(1, self.surface_size[1] >> level)))
+    if whole:
+      self.composite = pygame.transform.smoothscale(self.composeLevel(level, full), rect.size)
+      return rect.topleft
+
+    visible = rect.clip(pygame.Rect((0, 0), screen_size))
+    if visible.width == 0 or visible.height == 0:
+      self.composite = pygame.Surface((0, 0))
+      return visible.topleft
+    # level pixels under the visible area, rounded outwards
+    left = math.floor((visible.left - rect.left) / scale)
+    top = math.floor((visible.top - rect.top) / scale)
+    right = math.ceil((visible.right - rect.left) / scale)
+    bottom = math.ceil((visible.bottom - rect.top) / scale)
+    source = pygame.Rect(left, top, right - left, bottom - top).clip(full)
+    scaled = pygame.transform.smoothscale(self.composeLevel(level, source), (round(source.width * scale), round(source.height * scale)))
+    offset = (visible.left - rect.left - round(source.left * scale), visible.top - rect.top - round(source.top * scale))
+    self.composite = scaled.subsurface(pygame.Rect(offset, visible.size).clip(scaled.get_rect())).copy()
+    return visible.topleft
+
   def end(self, screen):
-    self.surface = pygame.transform.smoothscale(self.surface, (self.surface_size[0] * self.zoom, self.surface_size[1] * self.zoom))
-    self.surface = pygame.transform.flip(self.surface, False, True)
-    screen.blit(self.surface, self.origin)
-  
+    size = screen.get_size()
+    rect = self.getRect()
+    whole = rect.width * rect.height <= VIEWPORT_SCREENS * size[0] * size[1]
+    # a whole composite only depends on the zoom, panning blits it at the new origin
+    key = (self.zoom,) if whole else (self.zoom, self.origin, size)
+    if self.composite is None or self.composite_key != key:
+      self.composite_pos = self.compose(rect, whole, size)
+      self.composite_key = key
+    screen.blit(self.composite, rect.topleft if whole else self.composite_pos)
+    self.dirty = False
+    return rect
+
   def onMouseDown(self, pos):
     self.mouseDownPos = pos
     self.isMouseDown = True
 
   def onMouseUp(self, pos):
     self.isMouseDown = False
-  
+
   def onMouseMove(self, pos):
     if self.isMouseDown:
       self.origin = (self.origin[0] + pos[0] - self.mouseDownPos[0], self.origin[1] + pos[1] - self.mouseDownPos[1])
       self.mouseDownPos = pos
-  
+      self.dirty = True
+
   def onMouseWheel(self, direction):
     if direction > 0:
       self.zoom *= 1.05
     else:
-      self.zoom *= 0.95
\ No newline at end of file
+      self.zoom *= 0.95
+    self.dirty = True
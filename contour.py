@@ -1,6 +1,58 @@
-"""Helper class to extract the contours for the gmsh"""
+import cv2
+import numpy as np
+
+"""Simplify the contours found by cv2.findContours before they are turned into gmsh geometry.
+Every contour is reduced with the Douglas-Peucker algorithm (tolerance in pixels), and the
+holes and islands smaller than min_area (in squared pixels) are dropped together with the
+contours nested in them. Returns the contours, the matching hierarchy (same layout as
+cv2.findContours) and a report of the geometry removed.
+"""
+def simplifyContours(contours, hierarchy, tolerance, min_area):
+  report = {"contours": len(contours), "contours_kept": len(contours), "points": sum(len(c) for c in contours)}
+  report["points_kept"] = report["points"]
+  if hierarchy is None or len(contours) == 0:
+    return contours, hierarchy, report
+  hierarchy = hierarchy[0]
+
+  simplified = []
+  keep = np.ones(len(contours), dtype=bool)
+  for i, c in enumerate(contours):
+    s = cv2.approxPolyDP(c, tolerance, True) if tolerance > 0 else c
+    if len(s) < 3 or abs(cv2.contourArea(c)) < min_area:
+      keep[i] = False
+    simplified.append(s)
+
+  # a dropped contour takes the contours nested in it along
+  for i in range(len(contours)):
+    parent = hierarchy[i][3]
+    while keep[i] and parent != -1:
+      keep[i] = keep[parent]
+      parent = hierarchy[parent][3]
+
+  index = np.full(len(contours), -1)
+  index[keep] = np.arange(keep.sum())
+  new_hierarchy = np.full((keep.sum(), 4), -1, dtype=hierarchy.dtype)
+  children = {}
+  for i in np.flatnonzero(keep):
+    parent = index[hierarchy[i][3]] if hierarchy[i][3] != -1 else -1
+    new_hierarchy[index[i], 3] = parent
+    children.setdefault(parent, []).append(index[i])
+  for parent, kids in children.items():
+    if parent != -1:
+      new_hierarchy[parent, 2] = kids[0]
+    for a, b in zip(kids, kids[1:]):
+      new_hierarchy[a, 0] = b
+      new_hierarchy[b, 1] = a
+
+  kept = [simplified[i] for i in np.flatnonzero(keep)]
+  report["contours_kept"] = len(kept)
+  report["points_kept"] = sum(len(c) for c in kept)
+  return kept, new_hierarchy[np.newaxis], report
+
+"""Helper class to extract the contours for the gmsh. With spline, the contour is a single
+closed spline through its points instead of a polyline."""
 class Contour:
-  def __init__(self, factory, point_list, hierarchy, meshScale = 1):
+  def __init__(self, factory, point_list, hierarchy, meshScale = 1, spline = False):
     self.points = []
     self.poly_list = []
     self.line_indices = []
@@ -11,9 +63,12 @@ class Contour:
 
     for pt in point_list:
       self.addPoint(factory, pt, meshScale)
-    
-    for i in range(len(self.poly_list)):
-      self.line_indices.append(factory.addLine(self.poly_list[i], self.poly_list[(i + 1) % len(self.poly_list)]))
+
+    if spline and len(self.poly_list) > 3:
+      self.line_indices.append(factory.addSpline(self.poly_list + [self.poly_list[0]]))
+    else:
+      for i in range(len(self.poly_list)):
+        self.line_indices.append(factory.addLine(self.poly_list[i], self.poly_list[(i + 1) % len(self.poly_list)]))
 
     self.loop_index = factory.addCurveLoop(self.line_indices)
 
@@ -22,11 +77,11 @@ class Contour:
     index = factory.addPoint(pt[0], pt[1], 0, meshScale)
     self.points.append(pt)
     self.poly_list.append(index)
-  
+
   def makePlane(self, factory, contours):
     line_list = [self.loop_index]
     next = self.hierarchy[2]
     while next != -1:
       line_list.append(contours[next].loop_index)
       next = contours[next].hierarchy[0]
-    self.plane_index = factory.addPlaneSurface(line_list)
\ No newline at end of file
+    self.plane_index = factory.addPlaneSurface(line_list)
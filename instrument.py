@@ -0,0 +1,194 @@
+import os
+import sys
+import json
+import time
+import atexit
+import resource
+import threading
+import tracemalloc
+
+"""Stage level instrumentation: wall time, peak memory and element/node counts of the named
+stages of the meshing and solve paths, written as a Chrome trace (chrome://tracing, Perfetto).
+
+  BOXINGFEM_PROFILE=trace.json python boxingfem.py
+  python boxingfem.py batch specs/*.json --profile trace.json
+
+Stages are marked with
+
+  with instrument.stage("generate mesh") as s:
+    ...
+    s.count(nodes=len(coords))
+
+and nest. When profiling is off, stage returns a shared no-op object, so an instrumented
+stage costs one function call. When it is on, the Python and NumPy allocations are traced
+(tracemalloc): the peak memory of a stage is the highest traced allocation while it ran,
+memory allocated by native libraries (gmsh, SuperLU) only shows in the peak resident size of
+the process, recorded as well. Stages running at the same time on several threads share the
+allocation tracer, their peaks are then only approximate.
+
+The file holds the Chrome trace events ("traceEvents", one complete event per stage with its
+measurements as args) and the same records as plain JSON ("stages").
+"""
+
+# Environment variable enabling the profiling, holding the path of the trace written at exit
+ENVIRONMENT = "BOXINGFEM_PROFILE"
+
+_profiler = None
+
+"""Measurements of one stage, filled in when it ends"""
+class Stage:
+  def __init__(self, profiler, name, counts):
+    self.profiler = profiler
+    self.name = name
+    self.counts = dict(counts)
+
+  def count(self, **counts):
+    self.counts.update(counts)
+
+  def __enter__(self):
+    self.profiler.enter(self)
+    return self
+
+  def __exit__(self, *exc):
+    self.profiler.exit(self, failed=exc[0] is not None)
+    return False
+
+class _NullStage:
+  def count(self, **counts):
+    pass
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    return False
+
+_NULL_STAGE = _NullStage()
+
+"""Collects the stage records of the process. Every thread keeps its own stack of open stages;
+the peak of a nested stage is carried over to the stages around it. Without memory, the
+allocations are not traced (tracing slows down allocation heavy code) and only the times and
+counts are recorded.
+"""
+class Profiler:
+  def __init__(self, path = None, memory = True):
+    self.path = path
+    self.memory = memory
+    self.records = []
+    self.lock = threading.Lock()
+    self.local = threading.local()
+    self.origin = time.perf_counter()
+    if memory and not tracemalloc.is_tracing():
+      tracemalloc.start()
+
+  def stack(self):
+    if not hasattr(self.local, "stack"):
+      self.local.stack = []
+    return self.local.stack
+
+  def enter(self, stage):
+    stack = self.stack()
+    current, peak = tracemalloc.get_traced_memory() if self.memory else (0, 0)
+    if stack:
+      stack[-1].peak = max(stack[-1].peak, peak)
+    if self.memory:
+      tracemalloc.reset_peak()
+    stage.memory = stage.peak = current
+    stage.depth = len(stack)
+    stack.append(stage)
+    stage.start = time.perf_counter()
+
+  def exit(self, stage, failed = False):
+    end = time.perf_counter()
+    _, peak = tracemalloc.get_traced_memory() if self.memory else (0, 0)
+    if self.memory:
+      tracemalloc.reset_peak()
+    stack = self.stack()
+    stack.pop()
+    stage.peak = max(stage.peak, peak)
+    if stack:
+      stack[-1].peak = max(stack[-1].peak, stage.peak)
+    record = {
+      "name": stage.name,
+      "start": stage.start - self.origin,
+      "duration": end - stage.start,
+      "depth": stage.depth,
+      "thread": threading.current_thread().name,
+      "pid": os.getpid(),
+      **stage.counts,
+    }
+    if self.memory:
+      record["peak_memory"] = stage.peak - stage.memory
+      record["peak_rss"] = _peakResidentSize()
+    if failed:
+      record["failed"] = True
+    with self.lock:
+      self.records.append(record)
+
+  """Remove and return the records collected so far"""
+  def drain(self):
+    with self.lock:
+      records, self.records = self.records, []
+    return records
+
+  def extend(self, records):
+    with self.lock:
+      self.records.extend(records)
+
+  def write(self, path = None):
+    path = path or self.path
+    records = sorted(self.drain(), key=lambda r: (r["pid"], r["start"]))
+    threads = {}
+    events = []
+    for r in records:
+      tid = threads.setdefault((r["pid"], r["thread"]), len(threads))
+      args = {k: v for k, v in r.items() if k not in ("name", "start", "duration", "pid", "thread")}
+      events.append({"name": r["name"], "ph": "X", "ts": r["start"] * 1e6, "dur": r["duration"] * 1e6,
+                     "pid": r["pid"], "tid": tid, "args": args})
+    for (pid, thread), tid in threads.items():
+      events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread}})
+    with open(path, "w") as f:
+      json.dump({"traceEvents": events, "displayTimeUnit": "ms", "stages": records}, f, indent=1)
+    print(f"[Profile] {len(records)} stages written to {path}")
+
+"""Peak resident size of the process in bytes"""
+def _peakResidentSize():
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # kilobytes on Linux, bytes on macOS
+  return peak if sys.platform == "darwin" else peak * 1024
+
+"""Start profiling; the trace is written to path (if any) when the process exits"""
+def enable(path, memory = True):
+  global _profiler
+  if _profiler is None:
+    _profiler = Profiler(path, memory)
+    atexit.register(_writeAtExit)
+  else:
+    _profiler.path = path
+  return _profiler
+
+def enabled():
+  return _profiler is not None
+
+def _writeAtExit():
+  if _profiler is not None and _profiler.path:
+    _profiler.write()
+
+"""Context manager measuring the named stage, with optional counts (e.g. nodes, elements)"""
+def stage(name, **counts):
+  if _profiler is None:
+    return _NULL_STAGE
+  return Stage(_profiler, name, counts)
+
+"""Records collected so far in this process, removed from it (e.g. to hand them over from a
+worker process to the main one); empty when profiling is off"""
+def drain():
+  return _profiler.drain() if _profiler is not None else []
+
+"""Add records collected by another process"""
+def extend(records):
+  if _profiler is not None:
+    _profiler.extend(records)
+
+if os.environ.get(ENVIRONMENT):
+  enable(os.environ[ENVIRONMENT])
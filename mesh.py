@@ -1,203 +1,443 @@
 import cv2
-import copy
-import gmsh
+import math
 import time
-import meshio
-import pylab
+import sys
+import queue
+import threading
 import numpy as np
-import pygame
-import matplotlib.pyplot as plt
-from pyqtree import Index
-from matplotlib.cm import get_cmap
+from collections import namedtuple
 
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.backends.backend_agg as agg
-
-from contour import Contour
+import raster
+import instrument
+from boundary import BoundaryTable
+from contour import Contour, simplifyContours
+from meshcache import MeshCache, meshKey
+from renumber import rcmPermutation, bandwidth, applyPermutation, toOriginalOrder
 
 # Given an input image, the size of the mesh is approximately the length size dividing SCALE
 SCALE = 50
 
-"""A class for 2D mesh generation. Give the path of the input file, the class will 
-generate meshes as the required formats used my the FEM library.
-"""
-class MeshGenerator:
-  def __init__(self, path):
-    print("[Mesh Generator] reading file")
-    src = cv2.imread(path)
-    image = cv2.flip(src, 0)
-    self.width = image.shape[1]
-    self.height = image.shape[0]
-
-    meshScale = min(image.shape[0], image.shape[1]) / SCALE
-
-    print("[Mesh Generator] binarize image")
-    img_gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    ret, thresh = cv2.threshold(img_gray, 150, 255, cv2.THRESH_BINARY)
-
-    print("[Mesh Generator] extracting contours")
-    contours, hierarchy = cv2.findContours(image=thresh, mode=cv2.RETR_TREE, method=cv2.CHAIN_APPROX_TC89_L1)
+# Gray level separating the materials of the input image
+THRESHOLD = 150
 
-    print("[Mesh Generator] adding geometry")
-    gmsh.initialize()
-    gmsh.model.add("model")
+# Tolerance of the contour simplification, as a fraction of the mesh size (0 keeps every vertex)
+SIMPLIFY = 0.25
 
-    factory = gmsh.model.geo
-    cts = []
+# Holes and islands smaller than MIN_AREA squared mesh sizes are dropped (0 keeps them all)
+MIN_AREA = 1.0
 
-    for c, info in zip(contours, hierarchy[0]):
-        if info[3] == -1:
-            cts.append(None)
-            continue
-        cts.append(Contour(factory, c, info, meshScale))
+# Growth rate of the element size away from boundaries and refined regions, with adaptive sizing
+GROWTH = 1.3
 
-    for ct in cts:
-        if ct is not None:
-            ct.makePlane(factory, cts)
+# Images with more pixels than this are thresholded and traced on a reduced copy by default
+# (downsample="auto")
+MAX_CONTOUR_PIXELS = 16 * 1024 * 1024
 
-    print("[Mesh Generator] generating mesh")
-    factory.synchronize()
-    gmsh.model.mesh.generate(2)
+# Radius (in pixels) of the dots drawn on the boundary plot
+BOUNDARY_POINT_RADIUS = 2
 
-    print("[Mesh Generator] writing mesh")
-    gmsh.write("data/mesh.msh")
-    gmsh.finalize()
-    time.sleep(0.1)
+# Fraction of the whole pipeline done once each stage is finished
+STAGES = {
+  "read file": 0.05,
+  "binarize image": 0.08,
+  "extract contours": 0.12,
+  "add geometry": 0.25,
+  "generate mesh": 0.75,
+  "read mesh": 0.8,
+  "plot elements": 0.9,
+  "plot boundaries": 1.0,
+}
 
-    print("[Mesh Analyzer] reading mesh")
+# Fields of the contour simplification report
+GEOMETRY_REPORT = ["contours", "contours_kept", "points", "points_kept"]
 
-    mesh = meshio.read("data/mesh.msh")
+# Fields of the node renumbering report
+BANDWIDTH_REPORT = ["bandwidth", "bandwidth_renumbered", "profile", "profile_renumbered"]
 
-    self.points = mesh.points
-    self.cells = mesh.cells
-    self.point_data = mesh.point_data
-    self.cell_data = mesh.cell_data
+"""Progress of the mesh generation, sent when a stage is finished. generator is the
+MeshGenerator being built: its patches layer exists after "plot elements", its boundary
+layer and table after "plot boundaries" (the last stage). A failure is reported as the
+"failed" stage with the exception as error.
+"""
+MeshEvent = namedtuple("MeshEvent", ["stage", "fraction", "elapsed", "generator", "error"], defaults=[None])
+
+"""Turn every triangle of the (m, 3) connectivity counter-clockwise, with a single signed
+area pass over all the elements"""
+def orientElements(coords, elements):
+  tri = coords[elements]
+  area = (tri[:, 1, 0] - tri[:, 0, 0]) * (tri[:, 2, 1] - tri[:, 0, 1]) - (tri[:, 2, 0] - tri[:, 0, 0]) * (tri[:, 1, 1] - tri[:, 0, 1])
+  clockwise = area < 0
+  elements[clockwise] = elements[clockwise][:, [0, 2, 1]]
+  return elements
+
+"""Reduction factor of the image for the contour extraction: downsample itself, or with "auto"
+the smallest factor bringing the image under MAX_CONTOUR_PIXELS"""
+def contourFactor(downsample, width, height):
+  if downsample == "auto":
+    return max(1, math.ceil(math.sqrt(width * height / MAX_CONTOUR_PIXELS)))
+  return max(1, int(downsample))
+
+"""Whether a cached mesh can be used with the gmsh of this process. Cache entries record the
+gmsh version that meshed them; it is only compared when gmsh is already loaded, so that a
+cache hit never pays for importing gmsh."""
+def sameGmsh(mesh):
+  gmsh = sys.modules.get("gmsh")
+  return gmsh is None or "gmsh" not in mesh or str(mesh["gmsh"]) == gmsh.__version__
 
-    self.eles_list = []
-    self.nodes_list = []
-    self.loads_list = []
-    self.mater_list = []
+"""A class for 2D mesh generation. Give the path of the input file, the class will 
+generate meshes as the required formats used my the FEM library. Finished meshes are kept
+in a MeshCache (pass cache = None to always mesh again). progress, if given, is called with a
+MeshEvent at the end of every stage. simplify, min_area and spline control how the contours
+are cleaned up before becoming gmsh geometry (see contour.simplifyContours).
+
+By default every element has about the same size, min(width, height) / scale. Giving
+min_size and max_size (as multiples of that size) grades the mesh instead: elements are
+min_size near the material boundaries and inside the refine boxes (image space bounding
+boxes, e.g. around loaded and constrained points), and grow by the growth rate up to max_size
+in the bulk of the materials.
+
+With downsample (an integer factor, or "auto" to reduce images larger than
+MAX_CONTOUR_PIXELS), the image is thresholded and its contours are traced on a copy reduced by
+that factor; the contour points are mapped back to the centers of the full resolution pixels,
+so the mesh and every layer stay in full resolution image space.
+
+With renumber, the nodes are reordered (reverse Cuthill-McKee) right after the mesh is read,
+which keeps the stiffness matrix banded. Every node array of the generator (coordinates,
+boundary points, and so the selections, loads and results) uses the new numbering;
+permutation[i] is the gmsh order index of node i (among the nodes used by the elements, the
+control points of splines being dropped), see toOriginalOrder.
+"""
+class MeshGenerator:
+  def __init__(self, path, threshold = THRESHOLD, scale = SCALE, cache = True, progress = None,
+               simplify = SIMPLIFY, min_area = MIN_AREA, spline = False,
+               min_size = None, max_size = None, growth = GROWTH, refine = (), renumber = True, downsample = "auto"):
+    # matplotlib is only loaded once a mesh is built, off the startup path, and gmsh only
+    # when the mesh is not in the cache
+    from matplotlib.cm import get_cmap
+    self.progress = progress
+    self.start_time = time.perf_counter()
 
-    self.boundary_points = []
+    print("[Mesh Generator] reading file")
+    with instrument.stage("read file") as s:
+      with open(path, "rb") as f:
+        image_bytes = f.read()
+      src = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+      image = cv2.flip(src, 0)
+      self.width = image.shape[1]
+      self.height = image.shape[0]
+      s.count(bytes=len(image_bytes), pixels=self.width * self.height)
+    self.stageDone("read file")
+
+    if cache is True:
+      cache = MeshCache()
+    self.settings = {
+      "threshold": threshold,
+      "scale": scale,
+      "contour_mode": "RETR_TREE",
+      "contour_method": "CHAIN_APPROX_TC89_L1",
+      "simplify": simplify,
+      "min_area": min_area,
+      "spline": spline,
+      "min_size": min_size,
+      "max_size": max_size,
+      "growth": growth,
+      "refine": [list(map(float, box)) for box in refine],
+      "renumber": renumber,
+      "downsample": contourFactor(downsample, self.width, self.height),
+    }
+    key = meshKey(image_bytes, **self.settings)
+    with instrument.stage("cache load") as s:
+      mesh = cache.load(key) if cache else None
+      if mesh is not None and not sameGmsh(mesh):
+        mesh = None
+      s.count(hit=mesh is not None)
+    if mesh is None:
+      mesh = self.generateMesh(image)
+      if cache:
+        with instrument.stage("cache store"):
+          cache.store(key, mesh)
+    else:
+      print("[Mesh Generator] mesh loaded from cache")
+      self.stageDone("read mesh")
 
     cmap = get_cmap("tab20")
     self.colors = cmap.colors
 
-    print("[Mesh Analyzer] writing nodes")
-    for i, p in enumerate(self.points):
-      self.nodes_list.append([i, p[0], p[1], 0, 0]) 
-    
-    print("[Mesh Analyzer] writing and plotting elements")
-    self.plotPatches()
+    # node coordinates and [x-constraint, y-constraint] flags, one row per node
+    self.coords = mesh["coords"]
+    self.constraints = np.zeros((len(self.coords), 2), dtype=int)
+    # counter-clockwise triangles and their material ids
+    self.elements = mesh["elements"]
+    self.materials = mesh["materials"]
+    # boundary nodes, in order of first appearance along the boundary lines
+    self.boundary_ids = mesh["boundary"]
+    # [contours, contours kept, contour points, points kept] of the contour simplification
+    self.geometry_report = dict(zip(GEOMETRY_REPORT, mesh["geometry"].tolist()))
+    # gmsh order index of every node, and [bandwidth, profile] before and after renumbering
+    self.permutation = mesh["permutation"]
+    self.bandwidth_report = dict(zip(BANDWIDTH_REPORT, mesh["bandwidth"].tolist()))
 
-    print("[Mesh Analyzer] writing and plotting boundaries")
-    self.plotBoundaryPoints()
+    self.patches_plot_legend = []
+    for index in range(int(self.materials.max()) + 1 if len(self.materials) else 0):
+      self.patches_plot_legend.append([self.colors[index % len(self.colors)], f"Material {index + 1}"])
 
-    print("[Mesh Analyzer] building Qdtree")
-    self.buildQdtree()
-    
-  
-  def plotPatches(self):
-    fig = pylab.figure(figsize=[self.width / 40, self.height / 40], dpi=40)
-    ax = fig.gca()
+    print("[Mesh Analyzer] plotting elements")
+    with instrument.stage("plot elements", elements=len(self.elements)):
+      self.plotPatches()
+    self.stageDone("plot elements")
+
+    print("[Mesh Analyzer] writing and plotting boundaries")
+    with instrument.stage("plot boundaries", points=len(self.boundary_ids)):
+      self.plotBoundaryPoints()
+    self.stageDone("plot boundaries")
+
+  def stageDone(self, stage):
+    if self.progress is not None:
+      self.progress(MeshEvent(stage, STAGES[stage], time.perf_counter() - self.start_time, self))
+
+  """Threshold the image, build the gmsh geometry from its contours and mesh it. The mesh is
+  read straight from the gmsh API: node coordinates, the triangles of each surface (the
+  material id being the index of the surface) and the boundary nodes.
+  """
+  def generateMesh(self, image):
+    import gmsh
+    threshold = self.settings["threshold"]
+    meshScale = min(image.shape[0], image.shape[1]) / self.settings["scale"]
 
-    self.patch_list = []
-    index = 0
-    element_index = 0
+    print("[Mesh Generator] binarize image")
+    factor = self.settings["downsample"]
+    with instrument.stage("binarize image", downsample=factor) as s:
+      img_gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+      if factor > 1:
+        size = (-(-image.shape[1] // factor), -(-image.shape[0] // factor))
+        img_gray = cv2.resize(img_gray, size, interpolation=cv2.INTER_AREA)
+      ret, thresh = cv2.threshold(img_gray, threshold, 255, cv2.THRESH_BINARY)
+      s.count(pixels=thresh.size)
+    self.stageDone("binarize image")
 
-    self.patches_plot_legend = []
+    print("[Mesh Generator] extracting contours")
+    with instrument.stage("extract contours") as s:
+      contours, hierarchy = cv2.findContours(image=thresh, mode=cv2.RETR_TREE, method=cv2.CHAIN_APPROX_TC89_L1)
+      if factor > 1:
+        # reduced pixel i covers the full resolution pixels i * factor ... (i + 1) * factor - 1,
+        # centered on i * factor + (factor - 1) / 2 (a half pixel for even factors)
+        contours = [(c * factor + (factor - 1) / 2).astype(np.float32) for c in contours]
+      contours, hierarchy, report = simplifyContours(contours, hierarchy, self.settings["simplify"] * meshScale, self.settings["min_area"] * meshScale ** 2)
+      s.count(contours=report["contours_kept"], points=report["points_kept"])
+    print(f"[Mesh Generator] simplified contours: {report['points']} -> {report['points_kept']} points, "
+          f"{report['contours'] - report['contours_kept']} small holes/islands dropped")
+    self.stageDone("extract contours")
 
-    for cell in self.cells:
-        if cell.type == "triangle":
-            self.patch_list.append([])
-            legend_logged = False
-            for pt in cell.data:
-                ptlt = [self.points[pt[0]][0:2].tolist(), self.points[pt[1]][0:2].tolist(), self.points[pt[2]][0:2].tolist()]
-                color = self.colors[index % len(self.colors)]
-                t = plt.Polygon(ptlt, color = color)
-
-                if not legend_logged:
-                  self.patches_plot_legend.append([color, f"Material {index + 1}"])
-                  legend_logged = True
-
-                ax.add_patch(t)
-                self.patch_list[-1].append(copy.deepcopy(ptlt))
-
-                # write element
-                mean = np.mean(ptlt, axis=0)
-                angles = np.arctan2((ptlt-mean)[:, 1], (ptlt-mean)[:, 0])
-                angles[angles < 0] = angles[angles < 0] + 2 * np.pi
-                sorting_indices = np.argsort(angles)
-
-                self.eles_list.append([element_index, 3, index, pt[sorting_indices[0]], pt[sorting_indices[1]], pt[sorting_indices[2]]])
-                element_index += 1
-
-            index += 1
-    
-    ax.axis(xmin=0, xmax=self.width, ymin=0, ymax=self.height)
-    ax.get_xaxis().set_visible(False)
-    ax.get_yaxis().set_visible(False)
-    ax.spines['top'].set_visible(False)
-    ax.spines['right'].set_visible(False)
-    ax.spines['bottom'].set_visible(False)
-    ax.spines['left'].set_visible(False)
-
-    plt.subplots_adjust(left=0, right=1, top=1, bottom=0)
-
-    canvas = agg.FigureCanvasAgg(fig)
-    canvas.draw()
-    renderer = canvas.get_renderer()
-    self.patches_plot = pygame.image.fromstring(renderer.tostring_rgb(), (self.width, self.height), "RGB")
-    self.patches_plot = pygame.transform.flip(self.patches_plot, False, True)
-  
+    print("[Mesh Generator] adding geometry")
+    # gmsh can only install its interrupt handler from the main thread
+    gmsh.initialize(interruptible=threading.current_thread() is threading.main_thread())
+    try:
+      with instrument.stage("add geometry", contours=len(contours)):
+        gmsh.model.add("model")
+
+        factory = gmsh.model.geo
+        cts = []
+
+        for c, info in zip(contours, hierarchy[0] if hierarchy is not None else []):
+            if info[3] == -1:
+                cts.append(None)
+                continue
+            cts.append(Contour(factory, c, info, meshScale, self.settings["spline"]))
+
+        for ct in cts:
+            if ct is not None:
+                ct.makePlane(factory, cts)
+
+        factory.synchronize()
+        if self.settings["min_size"] is not None and self.settings["max_size"] is not None:
+          self.addSizeFields(meshScale)
+      self.stageDone("add geometry")
+
+      print("[Mesh Generator] generating mesh")
+      with instrument.stage("generate mesh"):
+        gmsh.model.mesh.generate(2)
+      self.stageDone("generate mesh")
+
+      print("[Mesh Analyzer] reading mesh")
+      with instrument.stage("read mesh") as s:
+        tags, xyz, _ = gmsh.model.mesh.getNodes(returnParametricCoord=False)
+        index = np.zeros(int(tags.max()) + 1 if len(tags) else 0, dtype=int)
+        index[tags.astype(int)] = np.arange(len(tags))
+        coords = np.ascontiguousarray(xyz.reshape(-1, 3)[:, 0:2])
+
+        triangles = []
+        for dim, tag in gmsh.model.getEntities(2):
+          types, _, node_tags = gmsh.model.mesh.getElements(dim, tag)
+          block = [index[n.astype(int)].reshape(-1, 3) for t, n in zip(types, node_tags) if t == 2]
+          if block and sum(len(b) for b in block):
+            triangles.append(np.concatenate(block))
+
+        lines = []
+        for dim, tag in gmsh.model.getEntities(1):
+          types, _, node_tags = gmsh.model.mesh.getElements(dim, tag)
+          lines += [index[n.astype(int)] for t, n in zip(types, node_tags) if t == 1]
+
+        elements = np.concatenate(triangles) if triangles else np.zeros((0, 3), dtype=int)
+        materials = np.repeat(np.arange(len(triangles)), [len(t) for t in triangles])
+        lines = np.concatenate(lines) if lines else np.zeros(0, dtype=int)
+
+        # gmsh also returns the nodes of its point entities, among them the control points of
+        # the splines, which no element uses: only the nodes of the triangles and lines are kept
+        used = np.zeros(len(coords), dtype=bool)
+        used[elements.ravel()] = True
+        used[lines] = True
+        if not used.all():
+          compact = np.cumsum(used) - 1
+          coords, elements, lines = coords[used], compact[elements], compact[lines]
+        orientElements(coords, elements)
+
+        _, first = np.unique(lines, return_index=True)
+        boundary = lines[np.sort(first)]
+        s.count(nodes=len(coords), elements=len(elements))
+    finally:
+      gmsh.finalize()
+
+    permutation = np.arange(len(coords))
+    with instrument.stage("renumber", nodes=len(coords)) as s:
+      band, profile = bandwidth(elements, len(coords))
+      band_renumbered, profile_renumbered = band, profile
+      if self.settings["renumber"] and len(coords):
+        permutation = rcmPermutation(elements, len(coords))
+        coords, elements, boundary = applyPermutation(permutation, coords, elements, boundary)
+        band_renumbered, profile_renumbered = bandwidth(elements, len(coords))
+        print(f"[Mesh Analyzer] renumbered nodes: bandwidth {band} -> {band_renumbered}, profile {profile} -> {profile_renumbered}")
+      s.count(bandwidth=band_renumbered)
+    self.stageDone("read mesh")
+
+    geometry = np.array([report[k] for k in GEOMETRY_REPORT])
+    bandwidth_report = np.array([band, band_renumbered, profile, profile_renumbered])
+    print(f"[Mesh Generator] {len(coords)} nodes, {len(elements)} elements")
+    return {"coords": coords, "elements": elements, "materials": materials, "boundary": boundary, "geometry": geometry,
+            "permutation": permutation, "bandwidth": bandwidth_report, "gmsh": np.array(gmsh.__version__)}
+
+  """Nodes in the solidspy layout [index, x, y, x-constraint, y-constraint]"""
+  def getNodesArray(self):
+    nodes = np.zeros((len(self.coords), 5))
+    nodes[:, 0] = np.arange(len(self.coords))
+    nodes[:, 1:3] = self.coords
+    nodes[:, 3:5] = self.constraints
+    return nodes
+
+  """Elements in the solidspy layout [index, type (3: triangle), material, n1, n2, n3]"""
+  def getElementsArray(self):
+    eles = np.zeros((len(self.elements), 6), dtype=int)
+    eles[:, 0] = np.arange(len(self.elements))
+    eles[:, 1] = 3
+    eles[:, 2] = self.materials
+    eles[:, 3:6] = self.elements
+    return eles
+
+  """Model arrays (nodes, elements, loads, materials) in the solidspy layout, taking the
+  constraints and forces set on the boundary points and one [E, nu] pair per material
+  """
+  def getModel(self, materials):
+    self.boundary.exportConstraints(self.constraints)
+    loads = self.boundary.exportLoads()
+    mats = np.reshape(np.asarray(materials, dtype=float), (-1, 2))
+    return self.getNodesArray(), self.getElementsArray(), loads, mats
+
+  """Per node values (n, ...) of this mesh, such as displacements, back in the gmsh node order"""
+  def toOriginalOrder(self, values):
+    return toOriginalOrder(self.permutation, values)
+
+  """List views of the arrays, only built on request"""
+  @property
+  def nodes_list(self):
+    return self.getNodesArray().tolist()
+
+  @property
+  def eles_list(self):
+    return self.getElementsArray().tolist()
+
+  """Rasterize the material patches, all triangles of a material in one fill"""
+  def plotPatches(self):
+    self.patches_buffer = raster.newBuffer(self.width, self.height)
+    for material, (color, _) in enumerate(self.patches_plot_legend):
+      raster.fillTriangles(self.patches_buffer, self.coords, self.elements[self.materials == material], color)
+    self.patches_plot = raster.toSurface(self.patches_buffer)
+
+  """Graded element sizes through gmsh size fields: the size grows linearly with the distance
+  to the contour curves and to the refine boxes, from min_size to max_size, so that neighbour
+  elements differ by about the growth rate. Has to be called on a synchronized model.
+  """
+  def addSizeFields(self, meshScale):
+    import gmsh
+    field = gmsh.model.mesh.field
+    min_size = self.settings["min_size"] * meshScale
+    max_size = self.settings["max_size"] * meshScale
+    ramp = (max_size - min_size) / max(self.settings["growth"] - 1, 1e-6)
+
+    distance = field.add("Distance")
+    field.setNumbers(distance, "CurvesList", [tag for _, tag in gmsh.model.getEntities(1)])
+    field.setNumber(distance, "Sampling", 100)
+    graded = field.add("Threshold")
+    field.setNumber(graded, "InField", distance)
+    field.setNumber(graded, "SizeMin", min_size)
+    field.setNumber(graded, "SizeMax", max_size)
+    field.setNumber(graded, "DistMin", 0)
+    field.setNumber(graded, "DistMax", ramp)
+    fields = [graded]
+
+    for xmin, ymin, xmax, ymax in self.settings["refine"]:
+      box = field.add("Box")
+      field.setNumber(box, "VIn", min_size)
+      field.setNumber(box, "VOut", max_size)
+      field.setNumber(box, "XMin", xmin)
+      field.setNumber(box, "XMax", xmax)
+      field.setNumber(box, "YMin", ymin)
+      field.setNumber(box, "YMax", ymax)
+      field.setNumber(box, "Thickness", ramp)
+      fields.append(box)
+
+    smallest = field.add("Min")
+    field.setNumbers(smallest, "FieldsList", fields)
+    field.setAsBackgroundMesh(smallest)
+
+    # only the background field sets the element sizes
+    gmsh.option.setNumber("Mesh.MeshSizeExtendFromBoundary", 0)
+    gmsh.option.setNumber("Mesh.MeshSizeFromPoints", 0)
+    gmsh.option.setNumber("Mesh.MeshSizeFromCurvature", 0)
+
+  """Build the boundary condition table of the boundary nodes and rasterize them as dots"""
   def plotBoundaryPoints(self):
-    fig = pylab.figure(figsize=[self.width / 40, self.height / 40], dpi=40)
-    ax = fig.gca()
-
-    index = 0
-    x = []
-    y = []
-    clr = []
-    point_set = set()
-    for cell in self.cells:
-        if cell.type == "line":
-            for pt in cell.data:
-              # [index, (x, y), x-constraint, y-constraint, x-force, y-force]
-              if pt[0] not in point_set:
-                point_set.add(pt[0])
-                self.boundary_points.append([pt[0], copy.deepcopy(self.points[pt[0]][0:2].tolist()), 0, 0, 0, 0])
-              if pt[1] not in point_set:
-                point_set.add(pt[1])
-                self.boundary_points.append([pt[1], copy.deepcopy(self.points[pt[1]][0:2].tolist()), 0, 0, 0, 0])
-              x.append(self.points[pt[0]][0:2].tolist()[0])
-              y.append(self.points[pt[0]][0:2].tolist()[1])
-              x.append(self.points[pt[1]][0:2].tolist()[0])
-              y.append(self.points[pt[1]][0:2].tolist()[1])
-              clr.append((0, 0.9, 0.1))
-              clr.append((0, 0.9, 0.1))
-            index += 1
-    plt.scatter(x, y, color = clr)
-    ax.axis(xmin=0, xmax=self.width, ymin=0, ymax=self.height)
-    ax.get_xaxis().set_visible(False)
-    ax.get_yaxis().set_visible(False)
-    ax.spines['top'].set_visible(False)
-    ax.spines['right'].set_visible(False)
-    ax.spines['bottom'].set_visible(False)
-    ax.spines['left'].set_visible(False)
-
-    plt.subplots_adjust(left=0, right=1, top=1, bottom=0)
-
-    canvas = agg.FigureCanvasAgg(fig)
-    canvas.draw()
-    renderer = canvas.get_renderer()
-    self.boundary_plot = pygame.image.fromstring(renderer.tostring_rgb(), (self.width, self.height), "RGB")
-    self.boundary_plot = pygame.transform.flip(self.boundary_plot, False, True)
-
-  def buildQdtree(self):
-    self.tree = Index(bbox=(0, 0, self.width, self.height))
-    for p in self.boundary_points:
-      self.tree.insert(p, (p[1][0], p[1][1], p[1][0], p[1][1]))
-  
+    self.boundary = BoundaryTable(self.boundary_ids, self.coords[self.boundary_ids])
+
+    self.boundary_buffer = raster.newBuffer(self.width, self.height)
+    raster.stampPoints(self.boundary_buffer, self.boundary.coords, (0, 0.9, 0.1), BOUNDARY_POINT_RADIUS)
+    self.boundary_plot = raster.toSurface(self.boundary_buffer)
+
+  """Rows of the boundary table inside bbox = (xmin, ymin, xmax, ymax)"""
   def getSelection(self, bbox):
-    return self.tree.intersect(bbox)
\ No newline at end of file
+    return self.boundary.query(bbox)
+
+
+"""Runs a MeshGenerator on a background thread. The stage events are queued as they come and
+picked up with poll from the UI loop, which can show every layer as soon as it is built.
+"""
+class MeshPipeline:
+  def __init__(self, path, **kwargs):
+    self.events = queue.Queue()
+    self.generator = None
+    self.thread = threading.Thread(target=self.run, args=(path,), kwargs=kwargs, name="mesh", daemon=True)
+    self.thread.start()
+
+  def run(self, path, **kwargs):
+    start = time.perf_counter()
+    try:
+      self.generator = MeshGenerator(path, progress=self.events.put, **kwargs)
+    except Exception as e:
+      self.events.put(MeshEvent("failed", 1.0, time.perf_counter() - start, None, e))
+
+  """Events queued since the last call, oldest first"""
+  def poll(self):
+    events = []
+    while True:
+      try:
+        events.append(self.events.get_nowait())
+      except queue.Empty:
+        return events
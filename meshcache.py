@@ -0,0 +1,89 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+
+# Bumped whenever the layout of the cached arrays, or the mesh built from the same settings,
+# changes
+VERSION = 5
+
+# Where the meshes are cached, and how many bytes the cache may take on disk
+CACHE_DIR = os.environ.get("BOXINGFEM_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "boxingfem", "meshes"))
+CACHE_SIZE = 512 * 1024 * 1024
+
+"""Cache key of a mesh: the bytes of the input image and every setting the meshing depends on"""
+def meshKey(image_bytes, **settings):
+  h = hashlib.sha256(image_bytes)
+  h.update(json.dumps(dict(settings, version=VERSION), sort_keys=True).encode())
+  return h.hexdigest()
+
+def _loadArray(path):
+  try:
+    return np.load(path, mmap_mode="r")
+  except ValueError:
+    # empty arrays cannot be memory mapped
+    return np.load(path)
+
+"""Content-addressed store of finished meshes. Each entry is a directory holding one .npy
+file per array, loaded back memory-mapped. The modification time of an entry records its
+last use; the least recently used entries are removed once the cache grows past max_bytes.
+"""
+class MeshCache:
+  def __init__(self, directory = CACHE_DIR, max_bytes = CACHE_SIZE):
+    self.directory = directory
+    self.max_bytes = max_bytes
+
+  def entryPath(self, key):
+    return os.path.join(self.directory, key)
+
+  """Dictionary of (read-only, memory-mapped) arrays stored under key, None on a miss"""
+  def load(self, key):
+    path = self.entryPath(key)
+    if not os.path.isdir(path):
+      return None
+    try:
+      arrays = {name[:-4]: _loadArray(os.path.join(path, name)) for name in os.listdir(path) if name.endswith(".npy")}
+      os.utime(path)
+    except (OSError, ValueError):
+      return None
+    return arrays
+
+  """Store a dictionary of arrays under key. The entry is written aside and moved in place
+  so that concurrent readers never see it half written.
+  """
+  def store(self, key, arrays):
+    os.makedirs(self.directory, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=".tmp-", dir=self.directory)
+    for name, array in arrays.items():
+      np.save(os.path.join(tmp, name + ".npy"), np.ascontiguousarray(array))
+    try:
+      os.replace(tmp, self.entryPath(key))
+    except OSError:
+      # stored in the meantime by another process
+      shutil.rmtree(tmp, ignore_errors=True)
+    self.evict(keep=key)
+
+  def evict(self, keep = None):
+    entries = []
+    for name in os.listdir(self.directory):
+      path = os.path.join(self.directory, name)
+      if name.startswith(".") or name == keep or not os.path.isdir(path):
+        continue
+      size = sum(f.stat().st_size for f in os.scandir(path) if f.is_file())
+      entries.append((os.path.getmtime(path), size, path))
+
+    kept = self.entryPath(keep) if keep is not None else None
+    total = sum(e[1] for e in entries)
+    if kept is not None and os.path.isdir(kept):
+      total += sum(f.stat().st_size for f in os.scandir(kept) if f.is_file())
+
+    for _, size, path in sorted(entries):
+      if total <= self.max_bytes:
+        break
+      shutil.rmtree(path, ignore_errors=True)
+      total -= size
+
+  def clear(self):
+    shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,178 @@
+import os
+import sys
+import json
+import struct
+import tempfile
+import numpy as np
+
+import instrument
+from postprocess import Fields
+
+"""Reading and writing of the FEM model (nodes, elements, loads and materials) and of its
+results, either in the text layout read by solidspy (eles.txt, nodes.txt, loads.txt and
+mater.txt) or in a single binary file (model.bfem) loaded back memory-mapped.
+
+The binary file starts with a fixed preamble: the magic bytes, the format version and the
+length of a JSON header (little-endian "<4sHHI"). The header lists every array with its dtype,
+shape and byte offset, plus free metadata; the raw array bytes follow, each aligned on
+ALIGNMENT bytes so they can be viewed in place without a copy.
+
+  python modelio.py data data/model.bfem     # solidspy text folder -> binary
+  python modelio.py data/model.bfem data     # binary -> solidspy text folder
+"""
+
+MAGIC = b"BFEM"
+# Bumped whenever the layout of the file changes; files of a newer version are refused
+VERSION = 1
+PREAMBLE = struct.Struct("<4sHHI")
+ALIGNMENT = 64
+
+# Permissions of the files written, those of open(): mkstemp creates its temporary file 0600.
+# The umask can only be read by setting it, so it is read once at import, before any thread
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+FILE_MODE = 0o666 & ~_UMASK
+
+# File name of the binary model in a folder
+MODEL_FILE = "model.bfem"
+
+MODEL_ARRAYS = ["nodes", "elements", "loads", "mats"]
+
+"""Write the model as the solidspy text files in the given folder"""
+def writeText(folder, nodes, elements, loads, mats):
+  os.makedirs(folder, exist_ok=True)
+  with instrument.stage("write text", nodes=len(nodes), elements=len(elements)):
+    np.savetxt(os.path.join(folder, "eles.txt"), elements, fmt="%d")
+    np.savetxt(os.path.join(folder, "nodes.txt"), nodes, fmt=("%d", "%.4f", "%.4f", "%d", "%d"))
+    np.savetxt(os.path.join(folder, "loads.txt"), np.reshape(loads, (-1, 3)), fmt=("%d", "%.6f", "%.6f"))
+    np.savetxt(os.path.join(folder, "mater.txt"), mats, fmt="%.6f")
+
+"""Read the solidspy text files of the given folder back as arrays"""
+def readText(folder):
+  nodes = np.loadtxt(os.path.join(folder, "nodes.txt"), ndmin=2)
+  mats = np.loadtxt(os.path.join(folder, "mater.txt"), ndmin=2)
+  elements = np.loadtxt(os.path.join(folder, "eles.txt"), ndmin=2, dtype=int)
+  loads = np.loadtxt(os.path.join(folder, "loads.txt"), ndmin=2).reshape(-1, 3)
+  return nodes, elements, loads, mats
+
+def _aligned(offset):
+  return -(-offset // ALIGNMENT) * ALIGNMENT
+
+"""Write a dictionary of arrays (and JSON serializable metadata) as one binary file. The file
+is written aside and moved in place, so readers never see it half written.
+"""
+def writeArrays(path, arrays, **meta):
+  arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+  entries = {}
+  offset = 0
+  for name, array in arrays.items():
+    if array.dtype.hasobject:
+      raise TypeError(f"array {name} holds Python objects")
+    entries[name] = {"dtype": array.dtype.newbyteorder("<").str, "shape": list(array.shape), "offset": offset}
+    offset = _aligned(offset + array.nbytes)
+  header = json.dumps({"arrays": entries, "meta": meta}).encode()
+  start = _aligned(PREAMBLE.size + len(header))
+
+  folder = os.path.dirname(os.path.abspath(path))
+  os.makedirs(folder, exist_ok=True)
+  fd, tmp = tempfile.mkstemp(prefix=".tmp-", dir=folder)
+  try:
+    with os.fdopen(fd, "wb") as f:
+      f.write(PREAMBLE.pack(MAGIC, VERSION, 0, len(header)))
+      f.write(header)
+      for name, array in arrays.items():
+        f.seek(start + entries[name]["offset"])
+        f.write(array.astype(entries[name]["dtype"], copy=False).data)
+      f.truncate(start + offset)
+    os.chmod(tmp, FILE_MODE)
+    os.replace(tmp, path)
+  except BaseException:
+    os.unlink(tmp)
+    raise
+
+def _parseHeader(preamble, read):
+  magic, version, _, length = PREAMBLE.unpack(preamble)
+  if magic != MAGIC:
+    raise ValueError("not a boxingfem binary file")
+  if version > VERSION:
+    raise ValueError(f"format version {version}, this version reads up to {VERSION}")
+  header = json.loads(read(length))
+  return version, header["arrays"], header["meta"], _aligned(PREAMBLE.size + length)
+
+"""Header of a binary file: (version, {name: {dtype, shape, offset}}, metadata, data start)"""
+def readHeader(path):
+  with open(path, "rb") as f:
+    try:
+      return _parseHeader(f.read(PREAMBLE.size), f.read)
+    except ValueError as e:
+      raise ValueError(f"{path}: {e}") from None
+
+def _views(data, entries, start):
+  arrays = {}
+  for name, e in entries.items():
+    dtype = np.dtype(e["dtype"])
+    begin = start + e["offset"]
+    count = int(np.prod(e["shape"]))
+    arrays[name] = data[begin:begin + count * dtype.itemsize].view(dtype).reshape(e["shape"])
+  return arrays
+
+"""Arrays of a binary file as read-only views on a memory map of the file (nothing is read
+until the arrays are used), and its metadata
+"""
+def readArrays(path):
+  _, entries, meta, start = readHeader(path)
+  end = max((start + e["offset"] + np.dtype(e["dtype"]).itemsize * int(np.prod(e["shape"])) for e in entries.values()), default=start)
+  if end == start:
+    # empty files cannot be memory mapped
+    return {name: np.zeros(e["shape"], dtype=e["dtype"]) for name, e in entries.items()}, meta
+  return _views(np.memmap(path, dtype=np.uint8, mode="r", offset=0, shape=(end,)), entries, start), meta
+
+"""Arrays (views on the buffer) and metadata of the content of a binary file held in memory,
+such as the bytes of a solve service result"""
+def parseArrays(buffer):
+  data = np.frombuffer(buffer, dtype=np.uint8)
+  position = [PREAMBLE.size]
+  def read(count):
+    chunk = data[position[0]:position[0] + count].tobytes()
+    position[0] += count
+    return chunk
+  _, entries, meta, start = _parseHeader(data[:PREAMBLE.size].tobytes(), read)
+  return _views(data, entries, start), meta
+
+"""Write the model, optionally with its result fields (postprocess.Fields) and any other named
+arrays (e.g. the node permutation of the mesh), as one binary file"""
+def writeModel(path, nodes, elements, loads, mats, fields = None, **arrays):
+  model = dict(zip(MODEL_ARRAYS, (np.asarray(nodes, dtype=float), np.asarray(elements, dtype=int),
+                                  np.reshape(np.asarray(loads, dtype=float), (-1, 3)), np.asarray(mats, dtype=float))))
+  if fields is not None:
+    model.update(fields._asdict())
+  model.update(arrays)
+  with instrument.stage("write model", nodes=len(model["nodes"]), elements=len(model["elements"])):
+    writeArrays(path, model, kind="model", results=fields is not None)
+
+"""Model arrays (nodes, elements, loads, mats) of a binary file, or of a solidspy text folder"""
+def readModel(path):
+  if os.path.isdir(path):
+    return readText(path)
+  arrays, _ = readArrays(path)
+  return tuple(arrays[name] for name in MODEL_ARRAYS)
+
+"""Result fields (postprocess.Fields) saved with the model of a binary file, None if there are none"""
+def readResults(path):
+  arrays, _ = readArrays(path)
+  if not all(name in arrays for name in Fields._fields):
+    return None
+  return Fields(*(arrays[name] for name in Fields._fields))
+
+"""Convert between a solidspy text folder and a binary file, in the direction given by which
+one of source and destination is the existing folder"""
+def convert(source, destination):
+  if os.path.isdir(source):
+    writeModel(destination, *readText(source))
+  else:
+    writeText(destination, *readModel(source))
+
+if __name__ == '__main__':
+  if len(sys.argv) != 3:
+    sys.exit("usage: python modelio.py <text folder> <file.bfem> | <file.bfem> <text folder>")
+  convert(sys.argv[1], sys.argv[2])
@@ -0,0 +1,105 @@
+import cv2
+import numpy as np
+
+import raster
+
+# Color used as transparent background of the overlays
+KEY = (255, 0, 255)
+
+# Overlays larger than this many screens are only rendered for their visible part
+VIEWPORT_SCREENS = 4
+
+"""Marker colors (n, 3) of the boundary points from their (n, 2) [x, y] constraint flags"""
+def constraintColors(constraints):
+  constraints = np.reshape(constraints, (-1, 2))
+  x = constraints[:, 0] < 0
+  y = constraints[:, 1] < 0
+  colors = np.empty((len(constraints), 3), dtype=np.uint8)
+  colors[:] = (0, 128, 128)
+  colors[x & y] = (0, 255, 255)
+  colors[x & ~y] = (0, 255, 128)
+  colors[~x & y] = (0, 128, 255)
+  return colors
+
+"""Markers (filled discs) and line segments rendered at one zoom level into a single
+transparent surface. While the zoomed markers span a few screens at most, they are rendered
+whole and the surface only has to be built again when the markers or the zoom change (panning
+blits it at a new offset); past that, only the markers over the screen are rendered into a
+screen sized surface, built again on every pan, so that zooming into a large image never
+allocates the zoomed extent. current tells whether the surface matches a view. Positions are
+given in image space (y up) for an image of the given height.
+"""
+class MarkerOverlay:
+  def __init__(self, image_height):
+    self.image_height = image_height
+    self.zoom = None
+    self.whole = True
+    self.key = None
+    self.surface = None
+    self.buffer = None
+    self.offset = (0, 0)
+
+  def toScreen(self, points, zoom):
+    points = np.reshape(np.asarray(points, dtype=float), (-1, 2))
+    return np.column_stack((points[:, 0] * zoom, (self.image_height - points[:, 1]) * zoom))
+
+  """Key of a view (zoom, canvas origin, screen size) for the last build"""
+  def viewKey(self, zoom, origin, screen_size):
+    return (zoom,) if self.whole else (zoom, tuple(origin), tuple(screen_size))
+
+  """Whether the surface was built for this view"""
+  def current(self, zoom, origin, screen_size):
+    return self.key is not None and self.key == self.viewKey(zoom, origin, screen_size)
+
+  """points (n, 2) with one 0-255 RGB color per point in colors (n, 3), and optional
+  segments (k, 2, 2) drawn with segment_color on top of the markers, for the view of a canvas
+  at origin on a screen of screen_size
+  """
+  def build(self, zoom, origin, screen_size, points, colors, radius, segments = None, segment_color = None, width = 1):
+    self.zoom = zoom
+    self.whole = True
+    self.key = self.viewKey(zoom, origin, screen_size)
+    self.surface = None
+    self.buffer = None
+    screen_points = self.toScreen(points, zoom)
+    screen_segments = self.toScreen(segments, zoom).reshape(-1, 2, 2) if segments is not None else np.zeros((0, 2, 2))
+    colors = np.reshape(np.asarray(colors, dtype=np.uint8), (-1, 3))
+    if len(screen_points) == 0 and len(screen_segments) == 0:
+      return
+
+    margin = max(radius, width) + 1
+    extent = np.concatenate((screen_points, screen_segments.reshape(-1, 2)))
+    low = np.floor(extent.min(axis=0) - margin).astype(int)
+    high = np.ceil(extent.max(axis=0) + margin).astype(int)
+    size = high - low
+    if size[0] * size[1] > VIEWPORT_SCREENS * screen_size[0] * screen_size[1]:
+      # only the part of the overlay over the screen, with the markers reaching into it
+      self.whole = False
+      self.key = self.viewKey(zoom, origin, screen_size)
+      low = np.maximum(low, -np.asarray(origin))
+      high = np.minimum(high, np.asarray(screen_size) - origin)
+      if np.any(high <= low):
+        return
+      inside = np.all((screen_points >= low - margin) & (screen_points <= high + margin), axis=1)
+      screen_points, colors = screen_points[inside], colors[inside]
+      ends = screen_segments.reshape(-1, 2, 2)
+      crossing = np.all((ends.min(axis=1) <= high + margin) & (ends.max(axis=1) >= low - margin), axis=1)
+      screen_segments = screen_segments[crossing]
+    self.offset = (int(low[0]), int(low[1]))
+
+    buffer = np.empty((high[1] - low[1], high[0] - low[0], 3), dtype=np.uint8)
+    buffer[:] = KEY
+    unique, inverse = np.unique(colors, axis=0, return_inverse=True)
+    for i, color in enumerate(unique):
+      raster.stampPoints(buffer, screen_points[inverse.ravel() == i] - low, color / 255, radius)
+    if len(screen_segments):
+      pts = np.round(screen_segments - low).astype(np.int32)
+      cv2.polylines(buffer, pts, False, tuple(int(c) for c in segment_color), width)
+
+    self.buffer = buffer
+    self.surface = raster.toSurface(buffer)
+    self.surface.set_colorkey(KEY)
+
+  def draw(self, screen, origin):
+    if self.surface is not None:
+      screen.blit(self.surface, (origin[0] + self.offset[0], origin[1] + self.offset[1]))
@@ -0,0 +1,69 @@
+import numpy as np
+from collections import namedtuple
+from scipy.sparse import csr_matrix
+
+from assembly import strainDisplacement, elasticityMatrices
+
+"""Result fields of one load case, every array having one row per node unless noted:
+  displacements     (n, 2) [ux, uy]
+  strains           (n, 3) [exx, eyy, gxy], engineering shear strain
+  stresses          (n, 3) [sxx, syy, txy]
+  von_mises         (n,)   plane stress von Mises stress
+  principal         (n, 2) [s1, s2], largest first
+  element_stresses  (m, 3) constant stress of every triangle
+The nodal strains and stresses are the averages over the triangles sharing the node.
+"""
+Fields = namedtuple("Fields", ["displacements", "strains", "stresses", "von_mises", "principal", "element_stresses"])
+
+"""Sparse (n, m) matrix averaging per element values onto the nodes of the triangles (m, 3)"""
+def nodalAveraging(triangles, nnodes):
+  triangles = np.asarray(triangles, dtype=int)
+  incidence = csr_matrix((np.ones(triangles.size), (triangles.ravel(), np.repeat(np.arange(len(triangles)), 3))),
+                         shape=(nnodes, len(triangles)))
+  count = np.asarray(incidence.sum(axis=1)).ravel()
+  incidence.data /= np.repeat(np.maximum(count, 1), np.diff(incidence.indptr))
+  return incidence
+
+"""von Mises stress of (k, 3) plane stresses [sxx, syy, txy]"""
+def vonMises(stresses):
+  sx, sy, txy = stresses[..., 0], stresses[..., 1], stresses[..., 2]
+  return np.sqrt(sx * sx - sx * sy + sy * sy + 3 * txy * txy)
+
+"""Principal stresses (k, 2) [s1, s2] of (k, 3) plane stresses [sxx, syy, txy]"""
+def principalStresses(stresses):
+  center = (stresses[..., 0] + stresses[..., 1]) / 2
+  radius = np.hypot((stresses[..., 0] - stresses[..., 1]) / 2, stresses[..., 2])
+  return np.stack((center + radius, center - radius), axis=-1)
+
+"""Strain and stress recovery of a triangle mesh. The B matrices, the constitutive matrix of
+every element and the averaging matrix are computed once; recovering the fields of a
+displacement solution is then a batched product over all elements and one sparse product.
+setMaterials swaps the constitutive matrices only, for the same mesh under other materials.
+"""
+class Recovery:
+  def __init__(self, coords, triangles, materials, mats):
+    self.triangles = np.asarray(triangles, dtype=int)
+    self.materials = np.asarray(materials, dtype=int)
+    self.B, _ = strainDisplacement(coords, self.triangles)
+    self.setMaterials(mats)
+    self.averaging = nodalAveraging(self.triangles, len(coords))
+
+  """Use new [E, nu] rows per material, keeping the B and averaging matrices of the mesh"""
+  def setMaterials(self, mats):
+    self.C = elasticityMatrices(mats)[self.materials]
+
+  """Fields of the nodal displacements (n, 2)"""
+  def fields(self, displacements):
+    displacements = np.asarray(displacements, dtype=float)
+    element_strains = np.einsum("eij,ej->ei", self.B, displacements[self.triangles].reshape(-1, 6))
+    element_stresses = np.einsum("eij,ej->ei", self.C, element_strains)
+    strains = self.averaging @ element_strains
+    stresses = self.averaging @ element_stresses
+    return Fields(displacements, strains, stresses, vonMises(stresses), principalStresses(stresses), element_stresses)
+
+"""Fields of a model in the solidspy layout (nodes, elements, mats) for the nodal
+displacements (n, 2)"""
+def recover(nodes, elements, mats, displacements):
+  nodes = np.asarray(nodes, dtype=float)
+  elements = np.asarray(elements, dtype=int)
+  return Recovery(nodes[:, 1:3], elements[:, 3:6], elements[:, 2], mats).fields(displacements)
@@ -0,0 +1,117 @@
+import cv2
+import numpy as np
+import pygame
+
+# Sub-pixel precision (in bits) of the triangle vertices handed to OpenCV
+SHIFT = 4
+
+# Largest number of candidate pixels tested at once by TriangleRaster
+BATCH_PIXELS = 1 << 22
+
+"""Helpers that rasterize the mesh layers straight into RGB NumPy buffers. Rows of the
+buffers follow the mesh y axis (row 0 is y = 0), the same orientation as the flipped input
+image the layers are blitted over.
+"""
+
+"""Allocate a white RGB buffer for a layer"""
+def newBuffer(width, height):
+  return np.full((height, width, 3), 255, dtype=np.uint8)
+
+"""Convert a matplotlib style (0-1 floats) color to 0-255 integers"""
+def toRGB(color):
+  return tuple(int(round(c * 255)) for c in color[0:3])
+
+"""Fill all the given triangles with one color in a single batched call.
+coords is the (n, 2) node array and triangles the (m, 3) connectivity.
+"""
+def fillTriangles(buffer, coords, triangles, color):
+  if len(triangles) == 0:
+    return buffer
+  pts = np.round(coords[triangles] * (1 << SHIFT)).astype(np.int32)
+  cv2.fillPoly(buffer, pts, toRGB(color), lineType=cv2.LINE_8, shift=SHIFT)
+  return buffer
+
+"""Stamp a filled disc of the given radius at every point, all points at once"""
+def stampPoints(buffer, points, color, radius):
+  if len(points) == 0:
+    return buffer
+  r = int(np.ceil(radius))
+  dy, dx = np.mgrid[-r:r + 1, -r:r + 1]
+  disc = dx * dx + dy * dy <= radius * radius
+  dx = dx[disc]
+  dy = dy[disc]
+
+  centers = np.round(np.asarray(points, dtype=float)).astype(int)
+  xs = (centers[:, 0:1] + dx).ravel()
+  ys = (centers[:, 1:2] + dy).ravel()
+  inside = (xs >= 0) & (xs < buffer.shape[1]) & (ys >= 0) & (ys < buffer.shape[0])
+  buffer[ys[inside], xs[inside]] = toRGB(color)
+  return buffer
+
+"""Lookup table (size, 3) of 0-255 colors sampled from a matplotlib colormap"""
+def colorTable(name, size = 256):
+  from matplotlib.cm import get_cmap
+  return np.round(get_cmap(name)(np.linspace(0, 1, size))[:, 0:3] * 255).astype(np.uint8)
+
+"""The pixels covered by a set of triangles, with the barycentric weights of every covered
+pixel in its triangle, so that per node values can be interpolated over the image in one
+gather. Triangles are processed in batches of similar bounding box size: the candidate pixels
+of a batch form a (triangles, k * k) grid tested all at once.
+  pixels   (p,) flat index of the covered pixels (row * width + column)
+  corners  (p, 3) nodes of the triangle covering each pixel
+  weights  (p, 3) barycentric weights of the pixel centers
+"""
+class TriangleRaster:
+  def __init__(self, width, height, coords, triangles):
+    self.width = width
+    self.height = height
+    triangles = np.asarray(triangles, dtype=int)
+    xy = np.asarray(coords, dtype=float)[triangles]
+    low = np.maximum(np.ceil(xy.min(axis=1)), 0).astype(int)
+    high = np.minimum(np.floor(xy.max(axis=1)), (width - 1, height - 1)).astype(int)
+    extent = (high - low).max(axis=1) + 1
+    x, y = xy[:, :, 0], xy[:, :, 1]
+    det = (y[:, 1] - y[:, 2]) * (x[:, 0] - x[:, 2]) + (x[:, 2] - x[:, 1]) * (y[:, 0] - y[:, 2])
+    visible = np.flatnonzero(((high >= low).all(axis=1)) & (det != 0))
+
+    pixels, corners, weights = [], [], []
+    # bounding boxes rounded up to powers of two
+    sizes = 1 << np.ceil(np.log2(extent[visible])).astype(int)
+    for k in np.unique(sizes):
+      batch = visible[sizes == k]
+      dy, dx = np.divmod(np.arange(k * k), k)
+      step = max(1, BATCH_PIXELS // (k * k))
+      for start in range(0, len(batch), step):
+        t = batch[start:start + step]
+        px = low[t, 0:1] + dx
+        py = low[t, 1:2] + dy
+        l0 = ((y[t, 1:2] - y[t, 2:3]) * (px - x[t, 2:3]) + (x[t, 2:3] - x[t, 1:2]) * (py - y[t, 2:3])) / det[t, None]
+        l1 = ((y[t, 2:3] - y[t, 0:1]) * (px - x[t, 2:3]) + (x[t, 0:1] - x[t, 2:3]) * (py - y[t, 2:3])) / det[t, None]
+        l2 = 1 - l0 - l1
+        inside = (l0 >= -1e-9) & (l1 >= -1e-9) & (l2 >= -1e-9) & (px <= high[t, 0:1]) & (py <= high[t, 1:2])
+        rows, _ = np.nonzero(inside)
+        pixels.append(py[inside] * width + px[inside])
+        corners.append(triangles[t[rows]])
+        weights.append(np.stack((l0[inside], l1[inside], l2[inside]), axis=1).astype(np.float32))
+
+    self.pixels = np.concatenate(pixels) if pixels else np.zeros(0, dtype=int)
+    self.corners = np.concatenate(corners) if corners else np.zeros((0, 3), dtype=int)
+    self.weights = np.concatenate(weights) if weights else np.zeros((0, 3), dtype=np.float32)
+
+  """Per pixel values (p,) interpolated from per node values (n,)"""
+  def interpolate(self, values):
+    return np.einsum("pi,pi->p", self.weights, np.asarray(values, dtype=np.float32)[self.corners])
+
+"""Color the pixels of a TriangleRaster by the per node values, mapped from [vmin, vmax] onto
+the lookup table"""
+def fillField(buffer, triangle_raster, values, table, vmin, vmax):
+  scaled = (triangle_raster.interpolate(values) - vmin) * ((len(table) - 1) / max(vmax - vmin, 1e-30))
+  index = np.clip(np.round(scaled), 0, len(table) - 1).astype(int)
+  buffer.reshape(-1, 3)[triangle_raster.pixels] = table[index]
+  return buffer
+
+"""Wrap the buffer into a pygame surface without copying. The surface shares the
+buffer memory, so the buffer has to be kept alive as long as the surface is used.
+"""
+def toSurface(buffer):
+  return pygame.image.frombuffer(buffer, (buffer.shape[1], buffer.shape[0]), "RGB")
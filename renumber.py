@@ -0,0 +1,48 @@
+import numpy as np
+
+"""Symmetric node adjacency (CSR) of the (m, 3) triangle connectivity"""
+def adjacency(elements, nnodes):
+  from scipy.sparse import coo_matrix
+  elements = np.asarray(elements, dtype=int)
+  rows = elements[:, [0, 1, 2, 1, 2, 0]].ravel()
+  cols = elements[:, [1, 2, 0, 0, 1, 2]].ravel()
+  graph = coo_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(nnodes, nnodes)).tocsr()
+  graph.data[:] = 1
+  return graph
+
+"""Reverse Cuthill-McKee ordering of the nodes, which shrinks the bandwidth of the stiffness
+matrix. The permutation lists the old index of every new node: new_coords = coords[perm].
+"""
+def rcmPermutation(elements, nnodes):
+  from scipy.sparse.csgraph import reverse_cuthill_mckee
+  return np.asarray(reverse_cuthill_mckee(adjacency(elements, nnodes), symmetric_mode=True), dtype=int)
+
+"""Bandwidth (largest index distance between two connected nodes) and profile (sum over the
+nodes of the distance to their lowest connected node) of a numbering"""
+def bandwidth(elements, nnodes):
+  elements = np.asarray(elements, dtype=int)
+  if len(elements) == 0:
+    return 0, 0
+  band = int((elements.max(axis=1) - elements.min(axis=1)).max())
+  lowest = np.arange(nnodes)
+  np.minimum.at(lowest, elements.ravel(), np.repeat(elements.min(axis=1), 3))
+  return band, int((np.arange(nnodes) - lowest).sum())
+
+"""Inverse permutation: the new index of every old node"""
+def inverse(perm):
+  inv = np.empty(len(perm), dtype=int)
+  inv[perm] = np.arange(len(perm))
+  return inv
+
+"""Renumber node based arrays: coords (n, k) are reordered, index arrays (elements, boundary
+node ids, ...) are mapped to the new numbering"""
+def applyPermutation(perm, coords, *indices):
+  inv = inverse(perm)
+  return (np.ascontiguousarray(np.asarray(coords)[perm]),) + tuple(inv[np.asarray(i, dtype=int)] for i in indices)
+
+"""Values given per new node (n, ...) back in the original node order"""
+def toOriginalOrder(perm, values):
+  values = np.asarray(values)
+  original = np.empty_like(values)
+  original[perm] = values
+  return original
@@ -0,0 +1,57 @@
+import numpy as np
+
+import raster
+
+# Colormap of the result layers
+COLORMAP = "jet"
+
+# Largest displacement drawn at deformation scale 1, as a fraction of the smaller image side
+DEFORMATION_SPAN = 0.1
+
+"""Scalar result fields shown as canvas layers, computed from the postprocess.Fields"""
+FIELDS = {
+  "Displacement magnitude": lambda fields: np.hypot(fields.displacements[:, 0], fields.displacements[:, 1]),
+  "σxx": lambda fields: fields.stresses[:, 0],
+  "σyy": lambda fields: fields.stresses[:, 1],
+  "τxy": lambda fields: fields.stresses[:, 2],
+  "von Mises": lambda fields: fields.von_mises,
+}
+
+"""Layers of the result fields of one solve, drawn on the (possibly deformed) mesh. The
+triangles are rasterized once per deformation scale into a raster.TriangleRaster; every field
+layer is then a single interpolation and lookup table pass, cached until the scale changes.
+The color range of a field does not depend on the scale.
+"""
+class ResultLayers:
+  def __init__(self, width, height, coords, triangles, fields):
+    self.width = width
+    self.height = height
+    self.coords = np.asarray(coords, dtype=float)
+    self.triangles = triangles
+    self.displacements = fields.displacements
+    self.table = raster.colorTable(COLORMAP)
+
+    self.values = {name: field(fields) for name, field in FIELDS.items()}
+    self.ranges = {name: (float(v.min()), float(v.max())) if len(v) else (0.0, 0.0) for name, v in self.values.items()}
+    largest = np.hypot(self.displacements[:, 0], self.displacements[:, 1]).max() if len(self.displacements) else 0
+    self.unit = DEFORMATION_SPAN * min(width, height) / max(largest, 1e-30)
+
+    self.scale = None
+    self.layers = {}
+
+  """Deformation scale, from 0 (undeformed) to 1 (largest displacement at DEFORMATION_SPAN)"""
+  def setScale(self, scale):
+    if scale != self.scale:
+      self.scale = scale
+      self.raster = raster.TriangleRaster(self.width, self.height, self.coords + self.displacements * (scale * self.unit), self.triangles)
+      self.layers = {}
+
+  """Surface of the named field, rendered on first use"""
+  def layer(self, name):
+    if self.scale is None:
+      self.setScale(0.0)
+    if name not in self.layers:
+      buffer = raster.fillField(raster.newBuffer(self.width, self.height), self.raster, self.values[name], self.table, *self.ranges[name])
+      # the surface shares the buffer memory, both are kept together
+      self.layers[name] = (buffer, raster.toSurface(buffer))
+    return self.layers[name][1]
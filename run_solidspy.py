@@ -1,6 +1,13 @@
+import os
 from solidspy.solids_GUI import solids_GUI
 import matplotlib.pyplot as plt
 
+import modelio
+
 if __name__ == '__main__':
+  # solidspy reads the text files, written from the binary model exported by the GUI
+  binary = os.path.join("data", modelio.MODEL_FILE)
+  if os.path.exists(binary):
+    modelio.writeText("data", *modelio.readModel(binary))
   displacement = solids_GUI(True, True, "./data/")
-  plt.show()
\ No newline at end of file
+  plt.show()
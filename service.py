@@ -0,0 +1,546 @@
+import os
+import re
+import sys
+import json
+import math
+import time
+import uuid
+import base64
+import binascii
+import signal
+import argparse
+import tempfile
+import threading
+import multiprocessing
+import multiprocessing.connection
+import urllib.error
+import urllib.request
+import numpy as np
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+"""Local solve service: the image -> mesh -> solve pipeline behind an HTTP/JSON interface,
+for scripts and several users sharing one machine.
+
+  python boxingfem.py serve [--port 8765] [-j 2] [--dir folder] [--images folder]
+
+Jobs are batch job specs (see batch.py) posted as JSON. The image is the file content in
+base64 ("image_data") or, when the service is started with an images folder, a path in that
+folder ("image"); other server paths are refused. A spec can instead name a mesh built by an
+earlier job ("mesh": id) and only give new materials, constraints and forces.
+The graded mesh options are not refined around the boundary conditions here, so a mesh does
+not depend on the loads solved on it.
+
+  POST /jobs                 submit a job spec: {"job": id, "mesh": id, "status": "queued"}
+  GET  /jobs/<id>[?wait=s]   status, sizes, cache hits and stage times (waits up to s seconds,
+                             at most MAX_WAIT, for the job to finish)
+  GET  /jobs/<id>/result     the model and its result fields in the binary layout of modelio
+                             (modelio.parseArrays reads it back)
+  GET  /meshes/<id>          nodes, elements and materials of a mesh
+  GET  /metrics              queue depth, jobs, per stage latency and cache hit rates
+
+The jobs are queued to a fixed pool of worker processes. Every job of a mesh goes to the same
+worker, which keeps its last meshes in memory along with the factorized systems of the solver,
+so new loads on a known mesh skip the meshing and, with the same constraints and materials,
+the factorization. Meshes are also shared by all the workers (and the GUI) through the mesh
+cache on disk. Client wraps the requests for Python callers.
+
+A worker process that dies is started again: its running job fails, its queued jobs are kept.
+The service forgets the least recently used meshes, and deletes their uploaded images, past
+MESHES_KEPT, and the results of the oldest jobs past JOBS_KEPT.
+"""
+
+PORT = 8765
+
+# Meshes kept in memory by every worker
+MESHES_PER_WORKER = 8
+
+# Finished jobs whose results are kept, the oldest are removed past it
+JOBS_KEPT = 256
+
+# Meshes (and their uploaded images) known to the service, the least recently used are
+# forgotten past it
+MESHES_KEPT = 64
+
+# Longest wait (seconds) for a job status
+MAX_WAIT = 3600
+
+# Seconds between two checks of the worker processes
+SUPERVISE_INTERVAL = 1.0
+
+# Latency samples kept per stage for the metrics
+LATENCY_WINDOW = 1000
+
+# Mesh ids, as returned by meshId
+MESH_ID = re.compile(r"[0-9a-f]{16}")
+
+"""Identifier of the mesh of an image with the mesh settings of a spec"""
+def meshId(image_bytes, spec):
+  from batch import meshSettings
+  from meshcache import meshKey
+  return meshKey(image_bytes, **meshSettings(spec, refine=False))[:16]
+
+"""Solve one job in a worker process. meshes holds the generators of this worker."""
+def _runJob(job, meshes, directory):
+  import instrument
+  import modelio
+  import solver
+  from batch import applyBoundaryConditions, meshSettings, specMaterials
+  from mesh import MeshGenerator
+
+  spec = job["spec"]
+  generator = meshes.get(job["mesh"])
+  warm = generator is not None
+  if warm:
+    meshes.move_to_end(job["mesh"])
+  else:
+    generator = MeshGenerator(job["image"], **meshSettings(spec, refine=False))
+    meshes[job["mesh"]] = generator
+    while len(meshes) > MESHES_PER_WORKER:
+      meshes.popitem(last=False)
+
+  rows = np.arange(len(generator.boundary))
+  generator.boundary.clearConstraints(rows)
+  generator.boundary.clearForces(rows)
+  applyBoundaryConditions(generator, spec)
+  nodes, elements, loads, mats = generator.getModel(specMaterials(spec, len(generator.patches_plot_legend), f"job {job['id']}"))
+  factorized = solver.isCached(nodes, elements, mats)
+  fields = solver.solve(nodes, elements, loads, mats)
+  path = os.path.join(directory, job["id"] + ".bfem")
+  modelio.writeModel(path, nodes, elements, loads, mats, fields, permutation=generator.permutation)
+
+  stages = {}
+  disk = None
+  for record in instrument.drain():
+    stages[record["name"]] = stages.get(record["name"], 0.0) + record["duration"]
+    if record["name"] == "cache load":
+      disk = record["hit"]
+  return {"nodes": len(nodes), "elements": len(elements), "materials": len(mats), "loads": len(loads),
+          "mesh_memory_hit": warm, "mesh_disk_hit": disk, "system_hit": factorized, "stages": stages, "result": path}
+
+def _worker(jobs, results, directory):
+  import instrument
+  # stage times only, the allocations are not traced
+  instrument.enable(None, memory=False)
+  meshes = OrderedDict()
+  while True:
+    job = jobs.get()
+    if job is None:
+      return
+    results.send(("started", job["id"], time.time()))
+    instrument.drain()
+    try:
+      summary = _runJob(job, meshes, directory)
+      results.send(("done", job["id"], time.time(), summary))
+    except Exception as e:
+      results.send(("failed", job["id"], time.time(), {"error": f"{type(e).__name__}: {e}"}))
+
+"""Counts of hits and misses, with their rate"""
+def _rate(hits, misses):
+  total = hits + misses
+  return {"hits": hits, "misses": misses, "rate": hits / total if total else None}
+
+"""Job table, worker pool and metrics of the service. Jobs are routed to the workers by mesh.
+The workers are supervised: one that died (out of memory, a crash in gmsh) is started again on
+a new queue and result pipe, its running job is failed and the jobs still queued for it are
+queued again. Image paths are only read within the images folder, when one is given."""
+class Service:
+  def __init__(self, workers = 2, directory = None, images = None):
+    self.directory = directory or tempfile.mkdtemp(prefix="boxingfem-service-")
+    os.makedirs(os.path.join(self.directory, "images"), exist_ok=True)
+    self.images = os.path.realpath(images) if images is not None else None
+    self.lock = threading.Lock()
+    self.jobs = {}
+    self.finished = deque()
+    # known meshes, least recently used first
+    self.meshes = OrderedDict()
+    self.events = {}
+    # worker index and payload of the queued and running jobs
+    self.assigned = {}
+    self.latency = {}
+    self.counters = {"submitted": 0, "done": 0, "failed": 0, "worker_restarts": 0}
+    self.hits = {"mesh_memory": [0, 0], "mesh_disk": [0, 0], "factorized_system": [0, 0]}
+    self.closing = False
+
+    self.context = multiprocessing.get_context()
+    # wakes the collector up on close
+    self.stopReader, self.stopWriter = self.context.Pipe(duplex=False)
+    self.queues = [None] * max(1, workers)
+    self.readers = [None] * max(1, workers)
+    self.workers = [None] * max(1, workers)
+    for index in range(len(self.workers)):
+      self.startWorker(index)
+    self.collector = threading.Thread(target=self.collect, name="results", daemon=True)
+    self.collector.start()
+
+  """Start worker index on a new job queue and result pipe. Neither is shared with a dead
+  worker, which may have died holding the lock of a queue or halfway through a message."""
+  def startWorker(self, index):
+    self.queues[index] = self.context.Queue()
+    if self.readers[index] is not None:
+      self.readers[index].close()
+    self.readers[index], writer = self.context.Pipe(duplex=False)
+    self.workers[index] = self.context.Process(target=_worker, args=(self.queues[index], writer, self.directory),
+                                               name=f"solve-worker-{index}", daemon=True)
+    self.workers[index].start()
+    # the pipe reads to its end once the worker has exited
+    writer.close()
+
+  """Queue a job spec. Raises KeyError for an unknown mesh, ValueError for an invalid spec."""
+  def submit(self, spec):
+    from batch import meshSettings
+    if not isinstance(spec, dict):
+      raise ValueError("a job spec is a JSON object")
+    spec = dict(spec)
+    image_bytes = None
+    if "mesh" in spec:
+      mesh_id = spec.pop("mesh")
+      if not isinstance(mesh_id, str) or not MESH_ID.fullmatch(mesh_id):
+        raise ValueError(f"mesh {mesh_id!r} is not a mesh id")
+    elif "image_data" in spec:
+      if not isinstance(spec["image_data"], str):
+        raise ValueError("image_data is the base64 text of the image file")
+      try:
+        image_bytes = base64.b64decode(spec.pop("image_data"), validate=True)
+      except binascii.Error as e:
+        raise ValueError(f"image_data is not base64: {e}") from None
+    elif "image" in spec:
+      image_bytes = self.readImage(spec.pop("image"))
+    else:
+      raise ValueError("a job needs an image, image_data or mesh")
+
+    image = None
+    if image_bytes is not None:
+      mesh_id = meshId(image_bytes, spec)
+      # written aside without the lock, only moved in place if the mesh is new
+      fd, image = tempfile.mkstemp(prefix=".tmp-", dir=os.path.join(self.directory, "images"))
+      with os.fdopen(fd, "wb") as f:
+        f.write(image_bytes)
+
+    job = {"id": uuid.uuid4().hex[:12], "mesh": mesh_id, "spec": spec}
+    record = {"job": job["id"], "mesh": mesh_id, "status": "queued", "submitted": time.time()}
+    # every job of a mesh goes to the worker keeping it warm
+    index = int(mesh_id, 16) % len(self.queues)
+    # the mesh is registered and its job assigned at once, so that it is not evicted in between
+    with self.lock:
+      mesh = self.meshes.get(mesh_id)
+      if mesh is None and image is None:
+        raise KeyError(f"unknown mesh {mesh_id}")
+      if mesh is None:
+        mesh = {"image": os.path.join(self.directory, "images", mesh_id), "settings": meshSettings(spec, refine=False)}
+        os.replace(image, mesh["image"])
+        self.meshes[mesh_id] = mesh
+      elif image is not None:
+        os.remove(image)
+      self.meshes.move_to_end(mesh_id)
+      spec.update(mesh["settings"])
+      job["image"] = mesh["image"]
+
+      self.jobs[job["id"]] = record
+      self.events[job["id"]] = threading.Event()
+      self.assigned[job["id"]] = (index, job)
+      self.counters["submitted"] += 1
+      self.queues[index].put(job)
+      self.evictMeshes()
+    return dict(record)
+
+  """Content of an image path of a job, read within the images folder only"""
+  def readImage(self, path):
+    if self.images is None:
+      raise ValueError("image paths are not read by this service, send the file as image_data")
+    if not isinstance(path, str):
+      raise ValueError("image is a path in the images folder")
+    full = os.path.realpath(os.path.join(self.images, path))
+    if os.path.commonpath([full, self.images]) != self.images:
+      raise ValueError(f"image {path} is outside the images folder")
+    try:
+      with open(full, "rb") as f:
+        return f.read()
+    except OSError as e:
+      raise ValueError(f"image {path}: {e.strerror}") from None
+
+  """Forget the least recently used meshes past MESHES_KEPT, with their uploaded image, unless
+  a queued or running job still needs them. Called with the lock held."""
+  def evictMeshes(self):
+    needed = {job["mesh"] for _, job in self.assigned.values()}
+    for mesh_id in list(self.meshes):
+      if len(self.meshes) <= MESHES_KEPT:
+        break
+      if mesh_id not in needed:
+        image = self.meshes.pop(mesh_id)["image"]
+        if os.path.exists(image):
+          os.remove(image)
+
+  """Pick up the messages of the workers and check on them, until close. The result pipes are
+  only read and replaced on this thread."""
+  def collect(self):
+    checked = time.monotonic()
+    while True:
+      readers = [reader for reader in self.readers if reader is not None]
+      ready = multiprocessing.connection.wait(readers + [self.stopReader], timeout=SUPERVISE_INTERVAL)
+      with self.lock:
+        for index, reader in enumerate(self.readers):
+          if reader in ready or self.stopReader in ready:
+            self.receive(index)
+        if self.stopReader in ready:
+          return
+        if time.monotonic() - checked >= SUPERVISE_INTERVAL:
+          self.supervise()
+          checked = time.monotonic()
+
+  """Handle the messages waiting on the pipe of worker index. The pipe is closed once read to
+  its end, after the worker exited. Called with the lock held."""
+  def receive(self, index):
+    reader = self.readers[index]
+    try:
+      while reader is not None and reader.poll():
+        self.handle(*reader.recv())
+    except (EOFError, OSError):
+      reader.close()
+      self.readers[index] = None
+
+  """Update a job from a worker message. Called with the lock held."""
+  def handle(self, state, job_id, stamp, summary = None):
+    record = self.jobs.get(job_id)
+    if record is None or record["status"] in ("done", "failed"):
+      return
+    if state == "started":
+      record.update(status="running", started=stamp)
+      self.sample("queue wait", stamp - record["submitted"])
+      return
+    record.update(summary)
+    if state == "done":
+      for stage, seconds in record["stages"].items():
+        self.sample(stage, seconds)
+      for name, hit in (("mesh_memory", record["mesh_memory_hit"]), ("mesh_disk", record["mesh_disk_hit"]),
+                        ("factorized_system", record["system_hit"])):
+        if hit is not None:
+          self.hits[name][0 if hit else 1] += 1
+      mesh = self.meshes.get(record["mesh"])
+      if mesh is not None:
+        mesh.update(nodes=record["nodes"], elements=record["elements"], materials=record["materials"])
+    self.finish(job_id, state, stamp)
+
+  """Mark a job done or failed and drop the oldest finished jobs. Called with the lock held."""
+  def finish(self, job_id, state, stamp):
+    record = self.jobs[job_id]
+    record.update(status=state, finished=stamp)
+    self.counters[state] += 1
+    self.sample("total", stamp - record["submitted"])
+    self.assigned.pop(job_id, None)
+    self.events.pop(job_id).set()
+    self.finished.append(job_id)
+    while len(self.finished) > JOBS_KEPT:
+      old = self.jobs.pop(self.finished.popleft())
+      if old.get("result") and os.path.exists(old["result"]):
+        os.remove(old["result"])
+
+  """Start the dead workers again: their running job fails, their queued jobs go to the new
+  process. Called with the lock held."""
+  def supervise(self):
+    if self.closing:
+      return
+    for index, worker in enumerate(self.workers):
+      if worker.is_alive():
+        continue
+      error = f"{worker.name} exited with code {worker.exitcode}"
+      print(f"[Service] {error}, restarting it")
+      # the messages sent before it died still count
+      self.receive(index)
+      self.startWorker(index)
+      self.counters["worker_restarts"] += 1
+      for job_id, (assigned, job) in list(self.assigned.items()):
+        if assigned != index:
+          continue
+        if self.jobs[job_id]["status"] == "running":
+          self.jobs[job_id]["error"] = error
+          self.finish(job_id, "failed", time.time())
+        else:
+          self.queues[index].put(job)
+
+  def sample(self, stage, seconds):
+    self.latency.setdefault(stage, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+  """Status record of a job (None if unknown), after waiting up to wait seconds for it to finish"""
+  def status(self, job_id, wait = 0):
+    with self.lock:
+      event = self.events.get(job_id)
+    if event is not None and wait > 0:
+      event.wait(wait)
+    with self.lock:
+      record = self.jobs.get(job_id)
+      return {k: v for k, v in record.items() if k != "result"} if record is not None else None
+
+  """Path of the result file of a finished job, None if it is unknown or not finished"""
+  def resultPath(self, job_id):
+    with self.lock:
+      record = self.jobs.get(job_id)
+      return record.get("result") if record is not None else None
+
+  def mesh(self, mesh_id):
+    with self.lock:
+      mesh = self.meshes.get(mesh_id)
+      return {"mesh": mesh_id, **{k: v for k, v in mesh.items() if k != "image"}} if mesh is not None else None
+
+  def metrics(self):
+    with self.lock:
+      statuses = [r["status"] for r in self.jobs.values()]
+      latency = {}
+      for stage, samples in self.latency.items():
+        values = np.array(samples)
+        latency[stage] = {"count": len(values), "mean": float(values.mean()), "p50": float(np.percentile(values, 50)),
+                          "p95": float(np.percentile(values, 95)), "max": float(values.max())}
+      return {
+        "workers": len(self.workers),
+        "workers_alive": sum(w.is_alive() for w in self.workers),
+        "queue_depth": statuses.count("queued"),
+        "running": statuses.count("running"),
+        "jobs": dict(self.counters),
+        "meshes": len(self.meshes),
+        "latency": latency,
+        "cache": {name: _rate(*counts) for name, counts in self.hits.items()},
+      }
+
+  def close(self):
+    with self.lock:
+      self.closing = True
+    for q in self.queues:
+      q.put(None)
+    for worker in self.workers:
+      worker.join(timeout=5)
+      if worker.is_alive():
+        worker.terminate()
+    self.stopWriter.send(None)
+    self.collector.join(timeout=5)
+
+class Handler(BaseHTTPRequestHandler):
+  server_version = "boxingfem"
+
+  def sendJSON(self, status, value):
+    body = json.dumps(value).encode()
+    self.send_response(status)
+    self.send_header("Content-Type", "application/json")
+    self.send_header("Content-Length", str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def do_POST(self):
+    if self.path.rstrip("/") != "/jobs":
+      return self.sendJSON(404, {"error": "not found"})
+    try:
+      spec = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+      self.sendJSON(202, self.server.service.submit(spec))
+    except KeyError as e:
+      self.sendJSON(404, {"error": str(e.args[0])})
+    except (OSError, TypeError, ValueError) as e:
+      self.sendJSON(400, {"error": str(e)})
+
+  def do_GET(self):
+    path, _, query = self.path.partition("?")
+    parts = [p for p in path.split("/") if p]
+    options = dict(p.split("=", 1) for p in query.split("&") if "=" in p)
+    service = self.server.service
+    if parts == ["metrics"]:
+      return self.sendJSON(200, service.metrics())
+    if len(parts) == 2 and parts[0] == "meshes":
+      mesh = service.mesh(parts[1])
+      return self.sendJSON(200, mesh) if mesh is not None else self.sendJSON(404, {"error": "unknown mesh"})
+    if len(parts) == 2 and parts[0] == "jobs":
+      try:
+        wait = float(options.get("wait", 0))
+      except ValueError:
+        wait = math.nan
+      if not 0 <= wait <= MAX_WAIT:
+        return self.sendJSON(400, {"error": f"wait must be a number of seconds from 0 to {MAX_WAIT}"})
+      record = service.status(parts[1], wait=wait)
+      return self.sendJSON(200, record) if record is not None else self.sendJSON(404, {"error": "unknown job"})
+    if len(parts) == 3 and parts[0] == "jobs" and parts[2] == "result":
+      result = service.resultPath(parts[1])
+      if result is None:
+        record = service.status(parts[1])
+        return self.sendJSON(404 if record is None else 409, {"error": "unknown job" if record is None else f"job {record['status']}"})
+      with open(result, "rb") as f:
+        body = f.read()
+      self.send_response(200)
+      self.send_header("Content-Type", "application/octet-stream")
+      self.send_header("Content-Length", str(len(body)))
+      self.end_headers()
+      self.wfile.write(body)
+      return
+    self.sendJSON(404, {"error": "not found"})
+
+  def log_message(self, format, *args):
+    pass
+
+"""HTTP server of a Service, run with serve_forever (or serve_forever on a thread in tests
+and scripts; port 0 picks a free port, see server_address)"""
+class ServiceServer(ThreadingHTTPServer):
+  daemon_threads = True
+
+  def __init__(self, host = "127.0.0.1", port = PORT, workers = 2, directory = None, images = None):
+    self.service = Service(workers, directory, images)
+    super().__init__((host, port), Handler)
+
+  def server_close(self):
+    super().server_close()
+    self.service.close()
+
+"""Python client of the service"""
+class Client:
+  def __init__(self, url = f"http://127.0.0.1:{PORT}"):
+    self.url = url.rstrip("/")
+
+  def request(self, method, path, value = None):
+    data = json.dumps(value).encode() if value is not None else None
+    request = urllib.request.Request(self.url + path, data=data, method=method, headers={"Content-Type": "application/json"})
+    try:
+      with urllib.request.urlopen(request) as response:
+        return response.read()
+    except urllib.error.HTTPError as e:
+      raise RuntimeError(f"{method} {path}: {e.code} {json.loads(e.read()).get('error')}") from None
+
+  def submit(self, spec):
+    return json.loads(self.request("POST", "/jobs", spec))
+
+  """Status of the job once finished (or after timeout seconds)"""
+  def wait(self, job_id, timeout = 60):
+    return json.loads(self.request("GET", f"/jobs/{job_id}?wait={timeout}"))
+
+  """Result arrays (model, postprocess.Fields arrays and permutation) and metadata of a job"""
+  def result(self, job_id):
+    import modelio
+    return modelio.parseArrays(self.request("GET", f"/jobs/{job_id}/result"))
+
+  """Submit a job spec and wait for its result arrays. Raises RuntimeError if it failed."""
+  def solve(self, spec, timeout = 60):
+    status = self.wait(self.submit(spec)["job"], timeout)
+    if status["status"] != "done":
+      raise RuntimeError(f"job {status['job']} {status['status']}: {status.get('error', '')}")
+    return status, self.result(status["job"])[0]
+
+  def metrics(self):
+    return json.loads(self.request("GET", "/metrics"))
+
+def main(argv = None):
+  parser = argparse.ArgumentParser(prog="boxingfem serve", description="Run the solve service on localhost")
+  parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+  parser.add_argument("--port", type=int, default=PORT)
+  parser.add_argument("-j", "--jobs", type=int, default=2, help="number of worker processes")
+  parser.add_argument("--dir", help="folder of the uploaded images and results (default: a temporary folder)")
+  parser.add_argument("--images", help="folder whose images jobs may name by path (default: images are only uploaded)")
+  args = parser.parse_args(argv)
+
+  server = ServiceServer(args.host, args.port, args.jobs, args.dir, args.images)
+  print(f"[Service] http://{server.server_address[0]}:{server.server_address[1]} with {args.jobs} workers, files in {server.service.directory}")
+  # stop the workers on kill as on Ctrl-C
+  signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    server.server_close()
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,147 @@
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from scipy.sparse.linalg import splu
+
+import instrument
+from assembly import Assembly
+from postprocess import Recovery
+
+# Number of factorized systems kept in memory
+CACHE_SIZE = 4
+
+"""The arrays handled by this module follow the solidspy layout:
+  nodes    [index, x, y, x-constraint, y-constraint]
+  elements [index, type, material, n1, n2, n3]
+  loads    [node, x-force, y-force]
+  mats     [Young's modulus, Poisson's ratio]
+"""
+
+def _asModel(nodes, elements, mats):
+  nodes = np.asarray(nodes, dtype=float)
+  elements = np.asarray(elements, dtype=int)
+  mats = np.reshape(np.asarray(mats, dtype=float), (-1, 2))
+  return nodes, elements, mats
+
+"""Sparse LU factorization of a stiffness matrix. The matrix is symmetric positive definite
+once constrained: a symmetric fill-reducing ordering without pivoting gives less fill-in and
+faster back-substitutions than the general purpose defaults of splu.
+"""
+def factorize(stiffness):
+  return splu(stiffness.tocsc(), permc_spec="MMD_AT_PLUS_A", diag_pivot_thresh=0, options={"SymmetricMode": True})
+
+"""Key identifying a stiffness matrix: the mesh, the materials and the constraint pattern"""
+def modelKey(nodes, elements, mats):
+  nodes, elements, mats = _asModel(nodes, elements, mats)
+  h = hashlib.sha1()
+  for a in (nodes[:, 1:3], nodes[:, 3:5].astype(int), elements, mats):
+    h.update(str(a.shape).encode())
+    h.update(np.ascontiguousarray(a).tobytes())
+  return h.hexdigest()
+
+"""The assembled global stiffness matrix (scipy.sparse, see assembly.Assembly) of a model
+together with its sparse LU factorization. Solving for a new set of loads only costs a
+back-substitution.
+"""
+class FactorizedSystem:
+  def __init__(self, nodes, elements, mats):
+    nodes, elements, mats = _asModel(nodes, elements, mats)
+    self.nodes = nodes
+    self.elements = elements
+    self.mats = mats
+
+    with instrument.stage("assemble", elements=len(elements)) as s:
+      self.assembly = Assembly(nodes, elements)
+      self.bc_array, self.neq = self.assembly.bc_array, self.assembly.neq
+      self.stiff_mat = self.assembly.stiffness(nodes[:, 1:3], mats)
+      s.count(equations=self.neq, nonzeros=self.stiff_mat.nnz)
+    with instrument.stage("factorize", equations=self.neq) as s:
+      self.lu = factorize(self.stiff_mat)
+      s.count(fill=self.lu.L.nnz + self.lu.U.nnz)
+    self.recovery = Recovery(nodes[:, 1:3], elements[:, 3:6], elements[:, 2], mats)
+
+  """Right-hand sides (neq, k) for a list of k load arrays"""
+  def loadVectors(self, load_cases):
+    return np.column_stack([self.assembly.loadVector(loads) for loads in load_cases]) if load_cases else np.zeros((self.neq, 0))
+
+  """Nodal displacements (k, nnodes, 2) for k load cases, solved in one pass"""
+  def displacements(self, load_cases):
+    with instrument.stage("back-substitution", load_cases=len(load_cases)):
+      disp = self.lu.solve(self.loadVectors(load_cases))
+    free = self.bc_array != -1
+    disp_complete = np.zeros((len(load_cases),) + self.bc_array.shape)
+    disp_complete[:, free] = disp[self.bc_array[free]].T
+    return disp_complete
+
+  """Result fields (postprocess.Fields) for each load case"""
+  def solve(self, load_cases):
+    displacements = self.displacements(load_cases)
+    with instrument.stage("recover fields", nodes=len(self.nodes), load_cases=len(load_cases)):
+      return [self.recovery.fields(disp_complete) for disp_complete in displacements]
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+"""Factorized system of the model, taken from the cache when the mesh, materials and
+constraints did not change (least recently used entries are dropped past CACHE_SIZE)
+"""
+def getSystem(nodes, elements, mats):
+  key = modelKey(nodes, elements, mats)
+  with _cache_lock:
+    if key in _cache:
+      _cache.move_to_end(key)
+      return _cache[key]
+
+  system = FactorizedSystem(nodes, elements, mats)
+  with _cache_lock:
+    _cache[key] = system
+    while len(_cache) > CACHE_SIZE:
+      _cache.popitem(last=False)
+  return system
+
+"""Whether the factorized system of the model is in the cache"""
+def isCached(nodes, elements, mats):
+  key = modelKey(nodes, elements, mats)
+  with _cache_lock:
+    return key in _cache
+
+def clearCache():
+  with _cache_lock:
+    _cache.clear()
+
+"""Solve a model held in memory. Returns the result fields (postprocess.Fields): nodal
+displacements, strains and stresses like solids_GUI, plus the derived stresses.
+"""
+def solve(nodes, elements, loads, mats):
+  with instrument.stage("solve", nodes=len(nodes), elements=len(elements)):
+    return getSystem(nodes, elements, mats).solve([loads])[0]
+
+"""Solve a batch of load cases on one model, a single factorization and one multi
+right-hand side back-substitution. Returns a list of postprocess.Fields.
+"""
+def solveLoadCases(nodes, elements, load_cases, mats):
+  with instrument.stage("solve", nodes=len(nodes), elements=len(elements), load_cases=len(load_cases)):
+    return getSystem(nodes, elements, mats).solve(load_cases)
+
+"""Runs the solves on a background thread so that the caller (the render loop) keeps going.
+submit returns a concurrent.futures.Future holding the result of solve. The optional callback
+is called with the postprocess.Fields from the worker thread, so GUI code should
+rather poll the future from its own loop.
+"""
+class Solver:
+  def __init__(self):
+    self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="solver")
+
+  def submit(self, nodes, elements, loads, mats, callback=None):
+    future = self.executor.submit(solve, nodes, elements, loads, mats)
+    if callback is not None:
+      def done(f):
+        if f.exception() is None:
+          callback(f.result())
+      future.add_done_callback(done)
+    return future
+
+  def shutdown(self):
+    self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,150 @@
+import os
+import sys
+import time
+import argparse
+import itertools
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from scipy.sparse import csr_matrix
+
+from assembly import Assembly, elementMatrices, strainDisplacement
+from postprocess import Recovery
+from solver import factorize
+
+"""Material parameter sweeps: one mesh, one set of boundary conditions, many [E, nu] samples.
+
+  python boxingfem.py sweep spec.json --material 2 --E 1 5 10 50 --nu 0.3 0.4 -o sweep.npz -j 4
+
+The spec is a batch job spec (see batch.py). Every combination of the given Young's moduli and
+Poisson's ratios is applied to the chosen material (numbered like the GUI legend, from 1), the
+other materials keep the values of the spec. All the samples are written to one compressed
+.npz holding the materials of every sample (k, materials, 2) and the postprocess.Fields arrays
+of every sample stacked along the first axis.
+"""
+
+# Plane stress constitutive matrix written as E / (1 - nu^2) * (C_E + nu * C_NU)
+C_E = np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 0.5]])
+C_NU = np.array([[0.0, 1.0, 0.0], [1.0, 0.0, 0.0], [0.0, 0.0, -0.5]])
+
+"""Stiffness matrix of a fixed mesh and constraint pattern split per material. The stiffness
+is linear in E / (1 - nu^2) and nu E / (1 - nu^2) of each material, so the CSR data of the two
+parts of every material group is computed once; the matrix of any [E, nu] per material is then
+a linear combination of these data vectors over the shared sparsity pattern.
+"""
+class MaterialDecomposition:
+  def __init__(self, nodes, elements, loads):
+    nodes = np.asarray(nodes, dtype=float)
+    self.assembly = Assembly(nodes, elements)
+    self.coords = nodes[:, 1:3]
+    self.rhs = self.assembly.loadVector(loads)
+    materials = self.assembly.materials
+    self.count = int(materials.max()) + 1 if len(materials) else 0
+
+    B, area = strainDisplacement(self.coords, self.assembly.triangles)
+    owner = materials[self.assembly.active // 36]
+    self.parts = np.zeros((self.count, 2, len(self.assembly.indices)))
+    for p, C in enumerate((C_E, C_NU)):
+      values = elementMatrices(B, area, np.broadcast_to(C, (max(self.count, 1), 3, 3)), materials).reshape(-1)[self.assembly.active]
+      for material in range(self.count):
+        group = owner == material
+        self.parts[material, p] = np.bincount(self.assembly.slots[group], weights=values[group], minlength=len(self.assembly.indices))
+    # the B and averaging matrices are shared by every sample, only the materials change
+    self.recovery = Recovery(self.coords, self.assembly.triangles, materials, np.tile([1.0, 0.0], (max(self.count, 1), 1)))
+
+  """Global stiffness matrix (CSR) for one [E, nu] row per material"""
+  def matrix(self, mats):
+    mats = np.reshape(np.asarray(mats, dtype=float), (-1, 2))[:self.count]
+    E, nu = mats[:, 0], mats[:, 1]
+    factor = E / (1 - nu ** 2)
+    data = np.einsum("m,mk->k", factor, self.parts[:, 0]) + np.einsum("m,mk->k", factor * nu, self.parts[:, 1])
+    return csr_matrix((data, self.assembly.indices, self.assembly.indptr), shape=(self.assembly.neq, self.assembly.neq))
+
+  """Result fields (postprocess.Fields) of the loads for one [E, nu] row per material"""
+  def solve(self, mats):
+    solution = factorize(self.matrix(mats)).solve(self.rhs)
+    self.recovery.setMaterials(mats)
+    return self.recovery.fields(self.assembly.nodalDisplacements(solution))
+
+# Decomposition of the model handled by a worker process
+_decomposition = None
+
+def _initWorker(nodes, elements, loads):
+  global _decomposition
+  _decomposition = MaterialDecomposition(nodes, elements, loads)
+
+def _solveSample(mats):
+  return _decomposition.solve(mats)._asdict()
+
+"""Solve the model (solidspy layout) for every material sample of samples (k, materials, 2),
+on a pool of workers processes that each build the decomposition once. Returns the dictionary
+of arrays {"mats": samples, field: (k, ...) stacked fields}, also written to output (a
+compressed .npz) when given. Raises ValueError when a sample holds a material that cannot be
+solved (see batch.checkMaterials).
+"""
+def sweep(nodes, elements, loads, samples, workers = 1, output = None):
+  from batch import checkMaterials
+  samples = np.asarray(samples, dtype=float)
+  for k, mats in enumerate(samples):
+    checkMaterials({"materials": mats.tolist()}, f"sample {k + 1}")
+  if workers > 1:
+    with ProcessPoolExecutor(max_workers=workers, initializer=_initWorker, initargs=(nodes, elements, loads)) as pool:
+      results = list(pool.map(_solveSample, samples, chunksize=max(1, len(samples) // (4 * workers))))
+  else:
+    _initWorker(nodes, elements, loads)
+    results = [_solveSample(mats) for mats in samples]
+
+  arrays = {"mats": samples}
+  for name in (results[0] if results else {}):
+    arrays[name] = np.stack([r[name] for r in results])
+  if output is not None:
+    np.savez_compressed(output, **arrays)
+  return arrays
+
+"""Samples (k, materials, 2) setting every combination of the Young's moduli and Poisson's
+ratios on one material (0 based) of the base materials"""
+def materialSamples(base, material, moduli, ratios):
+  base = np.reshape(np.asarray(base, dtype=float), (-1, 2))
+  samples = np.repeat(base[np.newaxis], len(moduli) * len(ratios), axis=0)
+  samples[:, material] = list(itertools.product(moduli, ratios))
+  return samples
+
+def main(argv = None):
+  from batch import loadSpec, applyBoundaryConditions, checkMaterials, specMaterials, meshSettings
+  from mesh import MeshGenerator
+
+  parser = argparse.ArgumentParser(prog="boxingfem sweep", description="Solve one job spec for many material parameters")
+  parser.add_argument("spec", help="JSON/YAML job spec")
+  parser.add_argument("--material", type=int, required=True, help="material to sweep, numbered from 1")
+  parser.add_argument("--E", type=float, nargs="+", required=True, help="Young's moduli")
+  parser.add_argument("--nu", type=float, nargs="+", help="Poisson's ratios (default: the one of the spec)")
+  parser.add_argument("-o", "--output", default="sweep.npz", help="compressed array store written")
+  parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="number of worker processes")
+  args = parser.parse_args(argv)
+
+  spec = loadSpec(args.spec)
+  try:
+    # the spec and the swept values are checked before anything is meshed
+    checkMaterials(spec, args.spec)
+    checkMaterials({"materials": [[E, nu] for E in args.E for nu in args.nu or [0.0]]}, "--E/--nu")
+  except ValueError as e:
+    parser.error(str(e))
+  generator = MeshGenerator(spec["image"], **meshSettings(spec))
+  applyBoundaryConditions(generator, spec)
+  try:
+    materials = specMaterials(spec, len(generator.patches_plot_legend), args.spec)
+  except ValueError as e:
+    parser.error(str(e))
+  nodes, elements, loads, mats = generator.getModel(materials)
+  if not 1 <= args.material <= len(mats):
+    parser.error(f"the mesh has {len(mats)} materials")
+  samples = materialSamples(mats, args.material - 1, args.E, args.nu or [mats[args.material - 1, 1]])
+
+  start = time.perf_counter()
+  sweep(nodes, elements, loads, samples, workers=max(1, args.jobs), output=args.output)
+  elapsed = time.perf_counter() - start
+  print(f"[Sweep] {len(samples)} samples of {len(elements)} elements in {elapsed:.2f}s "
+        f"({len(samples) / elapsed:.2f} samples/s), written to {args.output}")
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,162 @@
+import time
+import queue
+import threading
+import numpy as np
+from collections import namedtuple
+from scipy.sparse.linalg import LinearOperator, cg
+
+import instrument
+from assembly import Assembly, elasticityMatrices, elementMatrices, strainDisplacement
+from postprocess import Fields, nodalAveraging, principalStresses, vonMises
+from solver import factorize
+
+# Relative residual the conjugate gradient iterations stop at
+TOLERANCE = 1e-8
+
+# An element matrix is computed again once one of its nodes moved by more than this fraction
+# of the average element size since it was last computed (0 updates every moving element)
+UPDATE_TOLERANCE = 1e-4
+
+# The preconditioner is factorized again from the current stiffness matrix once a step needs
+# more iterations than this
+REFACTOR_ITERATIONS = 10
+
+"""One finished step: the current node coordinates (n, 2), the result fields accumulated over
+the steps (displacements from the initial geometry), the number of conjugate gradient
+iterations and the time spent in each part of the step (seconds).
+"""
+StepFrame = namedtuple("StepFrame", ["step", "coords", "fields", "iterations", "updated", "timings"])
+
+"""Updated-Lagrangian time stepping of a model in the solidspy layout (nodes, elements,
+loads, mats). Every step applies the loads as an increment on the current geometry: the
+stiffness matrix of the current node positions is solved for the displacement increment, which
+moves the nodes for the next step. Only the elements whose nodes moved since their matrix was
+last computed are assembled again, patching the global matrix in place (or rebuilding it when
+most elements changed). Each step is solved with conjugate gradients, warm-started from the
+previous increment and preconditioned with a factorization of an earlier stiffness matrix,
+which stays close while the geometry changes a little; it is refreshed once the iteration
+count grows past REFACTOR_ITERATIONS.
+"""
+class TimeStepper:
+  def __init__(self, nodes, elements, loads, mats, update_tolerance = UPDATE_TOLERANCE):
+    nodes = np.asarray(nodes, dtype=float)
+    elements = np.asarray(elements, dtype=int)
+    self.assembly = Assembly(nodes, elements)
+    self.triangles = self.assembly.triangles
+    self.materials = self.assembly.materials
+    self.C = elasticityMatrices(mats)
+    self.initial = nodes[:, 1:3].copy()
+    self.coords = nodes[:, 1:3].copy()
+    self.rhs = self.assembly.loadVector(loads)
+    self.averaging = nodalAveraging(self.triangles, len(self.coords))
+
+    # geometry of every element at the time its matrix was computed
+    self.B, self.area = strainDisplacement(self.coords, self.triangles)
+    self.element_stiffness = elementMatrices(self.B, self.area, self.C, self.materials)
+    self.element_coords = self.coords[self.triangles]
+    self.stiffness = self.assembly.matrix(self.element_stiffness)
+    edges = self.element_coords - np.roll(self.element_coords, 1, axis=1)
+    self.threshold = update_tolerance * (np.hypot(edges[..., 0], edges[..., 1]).mean() if len(edges) else 0)
+
+    self.element_strains = np.zeros((len(self.triangles), 3))
+    self.element_stresses = np.zeros((len(self.triangles), 3))
+    self.increment = np.zeros(self.assembly.neq)
+    self.preconditioner = None
+    self.step_count = 0
+
+  def refactorize(self):
+    lu = factorize(self.stiffness)
+    self.preconditioner = LinearOperator(self.stiffness.shape, lu.solve)
+
+  """Compute again the matrices of the elements whose nodes moved, patching the global matrix"""
+  def updateElements(self):
+    moved = np.abs(self.coords[self.triangles] - self.element_coords).max(axis=(1, 2))
+    changed = np.flatnonzero(moved > self.threshold)
+    if len(changed):
+      B, area = strainDisplacement(self.coords, self.triangles[changed])
+      matrices = elementMatrices(B, area, self.C, self.materials[changed])
+      if 2 * len(changed) < len(self.triangles):
+        self.assembly.update(self.stiffness, changed, self.element_stiffness[changed], matrices)
+        self.element_stiffness[changed] = matrices
+      else:
+        self.element_stiffness[changed] = matrices
+        self.stiffness = self.assembly.matrix(self.element_stiffness)
+      self.B[changed] = B
+      self.area[changed] = area
+      self.element_coords[changed] = self.coords[self.triangles[changed]]
+    return len(changed)
+
+  def step(self):
+    timings = {}
+    start = time.perf_counter()
+    updated = self.updateElements() if self.step_count else 0
+    timings["assemble"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if self.preconditioner is None:
+      self.refactorize()
+    timings["factorize"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    iterations = [0]
+    def count(_):
+      iterations[0] += 1
+    self.increment, info = cg(self.stiffness, self.rhs, x0=self.increment, rtol=TOLERANCE, M=self.preconditioner, callback=count)
+    if info > 0 or iterations[0] > REFACTOR_ITERATIONS:
+      # the preconditioner drifted too far from the current matrix
+      self.preconditioner = None
+    timings["solve"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    increment = self.assembly.nodalDisplacements(self.increment)
+    strains = np.einsum("eij,ej->ei", self.B, increment[self.triangles].reshape(-1, 6))
+    self.element_strains += strains
+    self.element_stresses += np.einsum("eij,ej->ei", self.C[self.materials], strains)
+    self.coords += increment
+    stresses = self.averaging @ self.element_stresses
+    fields = Fields(self.coords - self.initial, self.averaging @ self.element_strains, stresses,
+                    vonMises(stresses), principalStresses(stresses), self.element_stresses.copy())
+    timings["update"] = time.perf_counter() - start
+
+    self.step_count += 1
+    return StepFrame(self.step_count, self.coords.copy(), fields, iterations[0], updated, timings)
+
+
+"""Runs a TimeStepper on a background thread for a number of steps. The frames are queued as
+they finish and picked up with poll from the UI loop; stop ends the run after the current step.
+A failure is queued as the exception itself.
+"""
+class StepPipeline:
+  def __init__(self, nodes, elements, loads, mats, steps):
+    self.frames = queue.Queue()
+    self.stopped = threading.Event()
+    self.thread = threading.Thread(target=self.run, args=(nodes, elements, loads, mats, steps), name="steps", daemon=True)
+    self.thread.start()
+
+  def run(self, nodes, elements, loads, mats, steps):
+    try:
+      stepper = TimeStepper(nodes, elements, loads, mats)
+      for _ in range(steps):
+        if self.stopped.is_set():
+          break
+        with instrument.stage("time step") as s:
+          frame = stepper.step()
+          s.count(step=frame.step, iterations=frame.iterations, updated=frame.updated)
+        self.frames.put(frame)
+    except Exception as e:
+      self.frames.put(e)
+
+  def stop(self):
+    self.stopped.set()
+
+  def running(self):
+    return self.thread.is_alive()
+
+  """Frames (or an exception) queued since the last call, oldest first"""
+  def poll(self):
+    frames = []
+    while True:
+      try:
+        frames.append(self.frames.get_nowait())
+      except queue.Empty:
+        return frames
@@ -36,7 +36,34 @@ class UIPanel:
   def update(self):
     self.root.update()
   
+  """Result field layers, one radio button per field name (at most one field is shown), and
+  the deformation scale of the mesh they are drawn on"""
+  def addResultLayers(self, names):
+    self.resultField = tkinter.StringVar()
+    self.resultField.set("None")
+    self.deformScale = tkinter.DoubleVar()
+    self.deformScale.set(0.0)
+
+    tkinter.ttk.Label(self.root, text="Result Field").grid(row=self.row_start_index, column=0, sticky=tkinter.W, columnspan=2)
+    self.row_start_index += 1
+    for name in ["None"] + list(names):
+      tkinter.ttk.Radiobutton(self.root, text=name, variable = self.resultField, value = name).grid(row=self.row_start_index, column=0, sticky=tkinter.W, columnspan=2)
+      self.row_start_index += 1
+    tkinter.ttk.Label(self.root, text="Deformation scale").grid(row=self.row_start_index, column=0, sticky=tkinter.W)
+    tkinter.ttk.Scale(self.root, from_=0.0, to=1.0, variable = self.deformScale).grid(row=self.row_start_index, column=1, sticky=tkinter.W)
+    self.row_start_index += 1
+
+  """Reserve the place of the material patches legend, filled by setPatchesLegend once the
+  mesh is ready"""
+  def addPatchesLegend(self):
+    self.patches_frame = tkinter.ttk.Frame(self.root)
+    self.patches_frame.grid(row=self.row_start_index, column=0, sticky=tkinter.W, columnspan=2)
+    self.row_start_index += 1
+    self.patches_material = []
+
   def setPatchesLegend(self, legend):
+    if not hasattr(self, "patches_frame"):
+      self.addPatchesLegend()
     self.patches_legend = legend
     self.patches_material = []
 
@@ -44,23 +71,25 @@ class UIPanel:
       (r, g, b) = rgb
       return '#%02x%02x%02x' % (int(r*255), int(g*255), int(b*255))
     
-    tkinter.ttk.Label(self.root, text="Material Patches").grid(row=self.row_start_index, column=0, sticky=tkinter.W, columnspan=2)
-    self.row_start_index += 1
+    frame = self.patches_frame
+    row = 0
+    tkinter.ttk.Label(frame, text="Material Patches").grid(row=row, column=0, sticky=tkinter.W, columnspan=2)
+    row += 1
     for p in self.patches_legend:
       var1 = tkinter.DoubleVar()
       var1.set(1.0)
       var2 = tkinter.DoubleVar()
       var2.set(1.0)
       self.patches_material.append([var1, var2])
-      tkinter.ttk.Label(self.root, text="■", foreground=_from_rgb(p[0])).grid(row=self.row_start_index, column=0, sticky=tkinter.W)
-      tkinter.Label(self.root, text=p[1]).grid(row=self.row_start_index, column=1, sticky=tkinter.W)
-      self.row_start_index += 1
-      tkinter.ttk.Label(self.root, text="Young's Module").grid(row=self.row_start_index, column=0, sticky=tkinter.W)
-      tkinter.Entry(self.root, textvariable=var1).grid(row=self.row_start_index, column=1, sticky=tkinter.W)
-      self.row_start_index += 1
-      tkinter.ttk.Label(self.root, text="Poisson's ratio (-1 to 0.5)").grid(row=self.row_start_index, column=0, sticky=tkinter.W)
-      tkinter.ttk.Entry(self.root, textvariable=var2).grid(row=self.row_start_index, column=1, sticky=tkinter.W)
-      self.row_start_index += 1
+      tkinter.ttk.Label(frame, text="■", foreground=_from_rgb(p[0])).grid(row=row, column=0, sticky=tkinter.W)
+      tkinter.Label(frame, text=p[1]).grid(row=row, column=1, sticky=tkinter.W)
+      row += 1
+      tkinter.ttk.Label(frame, text="Young's Module").grid(row=row, column=0, sticky=tkinter.W)
+      tkinter.Entry(frame, textvariable=var1).grid(row=row, column=1, sticky=tkinter.W)
+      row += 1
+      tkinter.ttk.Label(frame, text="Poisson's ratio (-1 to 0.5)").grid(row=row, column=0, sticky=tkinter.W)
+      tkinter.ttk.Entry(frame, textvariable=var2).grid(row=row, column=1, sticky=tkinter.W)
+      row += 1
   
   def setEvent(self, e):
     self.event = e
@@ -115,4 +144,26 @@ class UIPanel:
     boldStyle = tkinter.ttk.Style()
     boldStyle.configure("Bold.TButton", font = ('Sans','10','bold'))
     tkinter.ttk.Button(self.root, text = "Calculate", style = "Bold.TButton", command= lambda: self.setEvent("calculate")).grid(row=self.row_start_index, column=0, sticky=tkinter.W)
-    self.row_start_index += 1
\ No newline at end of file
+    tkinter.ttk.Button(self.root, text = "Export", command= lambda: self.setEvent("export")).grid(row=self.row_start_index, column=1, sticky=tkinter.W)
+    self.row_start_index += 1
+  
+  """Number of updated-Lagrangian steps to run, with buttons to start and stop them"""
+  def setTimeStepping(self):
+    self.steps = tkinter.IntVar()
+    self.steps.set(20)
+
+    tkinter.ttk.Label(self.root, text="Time steps").grid(row=self.row_start_index, column=0, sticky=tkinter.W)
+    tkinter.ttk.Entry(self.root, textvariable=self.steps).grid(row=self.row_start_index, column=1, sticky=tkinter.W)
+    self.row_start_index += 1
+    tkinter.ttk.Button(self.root, text = "Run steps", command= lambda: self.setEvent("run-steps")).grid(row=self.row_start_index, column=0, sticky=tkinter.W)
+    tkinter.ttk.Button(self.root, text = "Stop", command= lambda: self.setEvent("stop-steps")).grid(row=self.row_start_index, column=1, sticky=tkinter.W)
+    self.row_start_index += 1
+
+  """Status line showing the progress of the background work"""
+  def setStatus(self):
+    self.status = tkinter.StringVar()
+    tkinter.ttk.Label(self.root, textvariable=self.status).grid(row=self.row_start_index, column=0, sticky=tkinter.W, columnspan=2)
+    self.row_start_index += 1
+
+  def showStatus(self, text):
+    self.status.set(text)
\ No newline at end of file